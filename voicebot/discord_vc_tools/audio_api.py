@@ -1,124 +1,575 @@
-import io
 import discord
 import asyncio
+import logging
+import threading
+import time
+from functools import partial
 import numpy as np
 from discord.ext import voice_recv
-from gcloud_api.gcloud_models import gcloud_stt, gcloud_tts
-from openai_api.openai_models import openai_gpt
+from gcloud_api.gcloud_models import (
+    gcloud_stt,
+    gcloud_tts,
+    gcloud_tts_cached,
+    gcloud_tts_stream,
+    tts_cache,
+    GcloudStreamingRecognizer,
+)
+from openai_api.openai_models import (
+    openai_gpt_async,
+    openai_gpt_stream_async,
+    aiter_sentences,
+)
+from openai_api.chat_history import ChatHistory
+from discord_vc_tools.utterance_queue import UtteranceQueue, MERGE
+from discord_vc_tools.resampler import SpeechResampler, downmix_resample
+from discord_vc_tools.audio_sources import (
+    PCMAudioSource,
+    OpusAudioSource,
+    StreamingAudioSource,
+    decode_opus,
+    encode_opus,
+    ogg_opus_source,
+    opus_cache_key,
+    pack_opus_packets,
+    unpack_opus_packets,
+)
+from discord_vc_tools.vad import (
+    VoiceActivityDetector,
+    PacketActivityDetector,
+    VAD_ACTIVE,
+    VAD_END,
+)
+from discord_vc_tools.opus_packets import is_silent_packet, silent_frame
+from discord_vc_tools.ogg import is_ogg, mux_ogg_opus
+from monitoring.metrics import (
+    QUEUE_DEPTH,
+    STAGE_REQUESTS,
+    WAKE_WORD_CHECKS,
+    track,
+    observe,
+)
+from monitoring.logs import Sampler
+
+logger = logging.getLogger(__name__)
 
 
 class AudioBuffer:
+    # Single-producer/single-consumer ring: the sink thread only advances
+    # write_pointer, readers only advance read_pointer. Every frame is written
+    # twice (mirrored storage) so any readable span is one contiguous view.
     def __init__(self, speaker, sink):
-        self.buffer = np.zeros(
-            shape=(sink.NUM_SAMPLES * sink.BUFFER_FRAME_COUNT, sink.NUM_CHANNELS),
+        self.frame_size = sink.NUM_SAMPLES
+        self.capacity = sink.NUM_SAMPLES * sink.BUFFER_FRAME_COUNT
+        self.buffer = np.empty(
+            shape=(2 * self.capacity, sink.NUM_CHANNELS),
             dtype="int16",
         )
-        self.buffer_pointer = 0
+        self.write_pointer = 0
+        self.read_pointer = 0
         self.speaker = speaker
 
-    def fill_buffer(self, frame, NUM_SAMPLES):
-        self.buffer[
-            (self.buffer_pointer * NUM_SAMPLES) : (
-                (1 + self.buffer_pointer) * NUM_SAMPLES
-            )
-        ] = frame
-        self.buffer_pointer += 1
-        print(f"BUFFER POINTER: {self.buffer_pointer}, USER: {self.speaker}")
+    @property
+    def buffer_pointer(self):
+        return (self.write_pointer - self.read_pointer) // self.frame_size
 
-    def clear_buffer(self):
-        self.buffer.fill(0)
-        self.buffer_pointer = 0
+    def is_full(self):
+        return self.write_pointer - self.read_pointer >= self.capacity
+
+    def fill_buffer(self, frame):
+        if self.is_full():
+            return False
+        start = self.write_pointer % self.capacity
+        end = start + len(frame)
+        self.buffer[start:end] = frame
+        self.buffer[start + self.capacity : end + self.capacity] = frame
+        self.write_pointer += len(frame)
+        return True
+
+    def read_buffer(self):
+        start = self.read_pointer % self.capacity
+        return self.buffer[start : start + (self.write_pointer - self.read_pointer)]
+
+    def clear_buffer(self, sample_count=None):
+        if sample_count is None:
+            self.read_pointer = self.write_pointer
+        else:
+            self.read_pointer += sample_count
 
 
 class BufferAudioSink(voice_recv.BasicSink):
-    def __init__(self, flush):
+    # Discord stops sending RTP when a user goes quiet, so the VAD may never
+    # see the silence that ends an utterance. A watchdog thread ends speech
+    # for any speaker whose last packet is older than end_of_speech_gap, and a
+    # speaking-stop event ends it right away. The lock serializes that with
+    # write(), which runs on the voice_recv router thread.
+    #
+    # With lazy_decode the sink asks voice_recv for raw Opus and decodes only
+    # packets it keeps: ignored speakers and silent packets cost no decoding.
+    # With opus_passthrough nothing is decoded: utterances are flushed as the
+    # speaker's original packets (pair it with PacketActivityDetector).
+
+    def __init__(
+        self,
+        flush,
+        on_frame=None,
+        vad_factory=VoiceActivityDetector,
+        end_of_speech_gap=0.3,
+        lazy_decode=False,
+        opus_passthrough=False,
+    ):
         super().__init__(None)
+        self.lazy_decode = lazy_decode
+        self.opus_passthrough = opus_passthrough
         self.flush = flush
+        self.on_frame = on_frame
+        self.vad_factory = vad_factory
+        self.end_of_speech_gap = end_of_speech_gap
+        self.last_packet_at = dict()
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        self.watchdog = None
         self.NUM_CHANNELS = discord.opus.Decoder.CHANNELS
         self.NUM_SAMPLES = discord.opus.Decoder.SAMPLES_PER_FRAME
-        self.BUFFER_FRAME_COUNT = 600
+        self.BUFFER_FRAME_COUNT = 300
+        # 54 s, under the 60 s sync recognize accepts. Checked when the ring
+        # drains, so keep it a multiple of BUFFER_FRAME_COUNT.
+        self.MAX_UTTERANCE_FRAMES = 9 * self.BUFFER_FRAME_COUNT
+        self.SILENCE = silent_frame(self.NUM_SAMPLES, self.NUM_CHANNELS).tobytes()
         self.buffers = dict()
+        self.detectors = dict()
+        self.decoders = dict()
+        self.packets = dict()
+        self.decoded_packets = 0
+        self.skipped_packets = 0
+        self.carry_over = dict()
+        self.speakers_by_ssrc = dict()
         self.caller_id = None
+        self.frame_sampler = Sampler()
 
     def _get_speaker_buffer(self, speaker):
         if self.buffers.get(speaker) is None:
             self.buffers[speaker] = AudioBuffer(speaker, self)
         return self.buffers[speaker]
 
-    def _build_frame(self, voice_data):
+    def _get_speaker_detector(self, speaker):
+        if self.detectors.get(speaker) is None:
+            self.detectors[speaker] = self.vad_factory()
+        return self.detectors[speaker]
+
+    def wants_opus(self):
+        return self.lazy_decode or self.opus_passthrough
+
+    def _packet_pcm(self, speaker, voice_data):
+        # voice_recv leaves pcm as b"" when the sink wants Opus.
+        if voice_data.pcm:
+            return voice_data.pcm
+        packet = voice_data.opus
+        if is_silent_packet(packet):
+            self.skipped_packets += 1
+            return self.SILENCE
+        if self.decoders.get(speaker) is None:
+            self.decoders[speaker] = discord.opus.Decoder()
+        try:
+            pcm = self.decoders[speaker].decode(packet, fec=False)
+        except discord.opus.OpusError as error:
+            logger.warning("Dropping undecodable voice packet: %s", error)
+            return None
+        self.decoded_packets += 1
+        return pcm
+
+    def _build_frame(self, pcm):
         try:
             frame = np.ndarray(
                 shape=(self.NUM_SAMPLES, self.NUM_CHANNELS),
                 dtype="int16",
-                buffer=voice_data.pcm,
+                buffer=pcm,
             )
-        except Exception as e:
-            print(e)
+        except Exception as error:
+            logger.warning("Dropping malformed voice frame: %s", error)
             return None
         return frame
 
+    def _drain_buffer(self, speaker, audio_buffer):
+        segment = audio_buffer.read_buffer()
+        self.carry_over.setdefault(speaker, []).append(segment.tobytes())
+        audio_buffer.clear_buffer(len(segment))
+
+    def _flush_speaker(self, speaker, audio_buffer):
+        self._drain_buffer(speaker, audio_buffer)
+        pcm_s16le = b"".join(self.carry_over.pop(speaker))
+        self.flush(speaker, pcm_s16le)
+
+    def _discard_speaker(self, speaker, audio_buffer):
+        audio_buffer.clear_buffer()
+        self.carry_over.pop(speaker, None)
+        self.flush(speaker, None)
+
+    def _flush_packets(self, speaker):
+        self.flush(speaker, self.packets.pop(speaker, []))
+
+    def _discard_packets(self, speaker):
+        self.packets.pop(speaker, None)
+        self.flush(speaker, None)
+
+    def _start_watchdog(self):
+        if self.watchdog is None and self.end_of_speech_gap:
+            self.watchdog = threading.Thread(
+                target=self._watch_gaps, name="end-of-speech", daemon=True
+            )
+            self.watchdog.start()
+
+    def _watch_gaps(self):
+        interval = max(self.end_of_speech_gap / 4, 0.01)
+        while not self.closed.wait(interval):
+            self.end_idle_speakers()
+
+    def end_idle_speakers(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            for speaker, last_packet in list(self.last_packet_at.items()):
+                if now - last_packet >= self.end_of_speech_gap:
+                    self._end_speech(speaker)
+
+    def _end_speech(self, speaker):
+        self.last_packet_at.pop(speaker, None)
+        detector = self.detectors.get(speaker)
+        if detector is None:
+            return
+        ended = detector.finish() == VAD_END
+        if self.opus_passthrough:
+            if ended:
+                self._flush_packets(speaker)
+            elif speaker in self.packets:
+                self._discard_packets(speaker)
+            return
+        current_buffer = self.buffers.get(speaker)
+        if current_buffer is None:
+            return
+        if ended:
+            self._flush_speaker(speaker, current_buffer)
+        elif current_buffer.buffer_pointer > 0 or speaker in self.carry_over:
+            self._discard_speaker(speaker, current_buffer)
+
+    @voice_recv.AudioSink.listener()
+    def on_voice_member_speaking_stop(self, member):
+        if member is None:
+            return
+        with self.lock:
+            if member.id in self.last_packet_at:
+                self._end_speech(member.id)
+
+    @voice_recv.AudioSink.listener()
+    def on_voice_member_disconnect(self, member, ssrc):
+        # member is None when the user is no longer cached, and voice_recv
+        # forgets the ssrc before dispatching, so the sink keeps its own map.
+        with self.lock:
+            speaker = self.speakers_by_ssrc.pop(ssrc, None)
+            if speaker is None and member is not None:
+                speaker = member.id
+            if speaker is None:
+                return
+            if speaker in self.last_packet_at:
+                self._end_speech(speaker)
+            # Per-speaker state lives only while the speaker is in the channel.
+            for state in (
+                self.buffers,
+                self.detectors,
+                self.decoders,
+                self.carry_over,
+                self.last_packet_at,
+                self.packets,
+            ):
+                state.pop(speaker, None)
+
+    def cleanup(self):
+        self.closed.set()
+
     def write(self, user, voice_data):
-        speaker = user.id
+        with self.lock:
+            if voice_data.packet is not None:
+                self.speakers_by_ssrc[voice_data.packet.ssrc] = user.id
+            self._write(user.id, voice_data)
+        self._start_watchdog()
 
+    def _write(self, speaker, voice_data):
         if self.caller_id and speaker != self.caller_id:
             self.flush(speaker, None)
             return
 
+        if self.opus_passthrough:
+            self._write_packet(speaker, voice_data.opus)
+            return
+
         current_buffer = self._get_speaker_buffer(speaker)
 
-        frame = self._build_frame(voice_data)
+        pcm = self._packet_pcm(speaker, voice_data)
+        frame = self._build_frame(pcm) if pcm is not None else None
         if frame is None:
             self.flush(speaker, None)
             return
 
-        if current_buffer.buffer_pointer > self.BUFFER_FRAME_COUNT - 2:
-            pcm_s16le = current_buffer.buffer.tobytes()
-            self.flush(speaker, pcm_s16le)
-            current_buffer.clear_buffer()
-            return
+        activity = self._get_speaker_detector(speaker).update(frame)
 
-        if np.abs(frame).sum() > 500:
-            current_buffer.fill_buffer(frame, self.NUM_SAMPLES)
-        elif current_buffer.buffer_pointer > 0:
-            pcm_s16le = current_buffer.buffer.tobytes()
-            self.flush(speaker, pcm_s16le)
-            current_buffer.clear_buffer()
+        if activity == VAD_ACTIVE:
+            self.last_packet_at[speaker] = time.monotonic()
+            if current_buffer.is_full():
+                # Long utterance: carry the ring contents over instead of
+                # splitting it, up to the recognizer's length limit.
+                self._drain_buffer(speaker, current_buffer)
+                carried_frames = (
+                    sum(len(chunk) for chunk in self.carry_over[speaker])
+                    // (self.NUM_SAMPLES * self.NUM_CHANNELS * 2)
+                )
+                if carried_frames >= self.MAX_UTTERANCE_FRAMES:
+                    self._flush_speaker(speaker, current_buffer)
+            current_buffer.fill_buffer(frame)
+            if self.on_frame is not None:
+                self.on_frame(speaker, pcm)
+            if logger.isEnabledFor(logging.DEBUG) and self.frame_sampler.should_log(
+                speaker
+            ):
+                logger.debug(
+                    "Buffer pointer %d for user %s",
+                    current_buffer.buffer_pointer,
+                    speaker,
+                )
+        elif activity == VAD_END:
+            self.last_packet_at.pop(speaker, None)
+            self._flush_speaker(speaker, current_buffer)
+        else:
+            self.last_packet_at.pop(speaker, None)
+            if current_buffer.buffer_pointer > 0 or speaker in self.carry_over:
+                self._discard_speaker(speaker, current_buffer)
+
+    def _write_packet(self, speaker, packet):
+        activity = self._get_speaker_detector(speaker).update(packet)
+        if activity == VAD_ACTIVE:
+            self.last_packet_at[speaker] = time.monotonic()
+            packets = self.packets.setdefault(speaker, [])
+            packets.append(packet)
+            if len(packets) >= self.MAX_UTTERANCE_FRAMES:
+                self._flush_packets(speaker)
+        elif activity == VAD_END:
+            self.last_packet_at.pop(speaker, None)
+            self._flush_packets(speaker)
+        else:
+            self.last_packet_at.pop(speaker, None)
+            if speaker in self.packets:
+                self._discard_packets(speaker)
 
 
 class AudioListener:
-    def __init__(self):
+    def __init__(
+        self,
+        queue_size=8,
+        transcription_workers=2,
+        overflow_policy=MERGE,
+        streaming_stt=False,
+        streaming_llm=False,
+        stt_limiter=None,
+        tts_limiter=None,
+        wake_word_detector=None,
+        end_of_speech_gap=0.3,
+        lazy_decode=True,
+        opus_passthrough=False,
+        tts_encoding="OGG_OPUS",
+        streaming_tts=False,
+        preroll=0.2,
+        preroll_timeout=10.0,
+    ):
         discord.opus._load_default()
         self.transcriber = gcloud_stt
-        self.synthesizer = gcloud_tts
-        self.language_model = openai_gpt
+        self.stream_transcriber = GcloudStreamingRecognizer
+        self.synthesizer = partial(gcloud_tts, encoding=tts_encoding)
+        self.cached_synthesizer = partial(gcloud_tts_cached, encoding=tts_encoding)
+        self.stream_synthesizer = gcloud_tts_stream
+        self.streaming_tts = streaming_tts
+        self.preroll = preroll
+        self.preroll_timeout = preroll_timeout
+        self.opus_cache = tts_cache
+        self.language_model = openai_gpt_async
+        self.stream_language_model = openai_gpt_stream_async
+        self.streaming_llm = streaming_llm
+        self.wake_word_detector = wake_word_detector
         self.voice_client = None
-        self.audio_sink = BufferAudioSink(self._transcribe)
+        self.queue_size = queue_size
+        self.transcription_workers = transcription_workers
+        self.overflow_policy = overflow_policy
+        self.utterance_queue = None
+        self.streaming_stt = streaming_stt
+        self.streams = dict()
+        self.stream_ends = dict()
+        self.stream_preroll = dict()
+        self.loop = None
+        self.guild = "none"
+        self.stt_limiter = stt_limiter or asyncio.Semaphore(transcription_workers)
+        self.tts_limiter = tts_limiter or asyncio.Semaphore(1)
+        # Streaming recognition is fed PCM frames, so it cannot pass Opus through.
+        opus_passthrough = opus_passthrough and not streaming_stt
+        self.audio_sink = BufferAudioSink(
+            self._enqueue_utterance,
+            on_frame=self._stream_frame if streaming_stt else None,
+            vad_factory=(
+                PacketActivityDetector if opus_passthrough else VoiceActivityDetector
+            ),
+            end_of_speech_gap=end_of_speech_gap,
+            lazy_decode=lazy_decode,
+            opus_passthrough=opus_passthrough,
+        )
         self.vc_system_prompt = "Jesteś asystentem głosowym na platformie Discord, a Twoje imię to Alvin. Zachowuj się, jakbyś rozmawiał na kanale głosowym Discord. Do odpowiedzi używaj tylko słów! Na koniec swojej wypowiedzi upewnij się, że użytkownik dalej chce rozmawiać. Jeśli użytkownik podziękuje lub wykryjesz zakończenie rozmowy, napisz na koniec słowo 'True'"
         self.activate_words = ["alvin", "Alvin", "ALVIN", "alwin", "Alwin", "ALWIN"]
-        self.chat_history = []
-        self.messages = []
+        self.chat_history = ChatHistory(self.vc_system_prompt, summarizer=self._summarize)
+        self.transcripts = asyncio.Queue()
+        self.responses = asyncio.Queue()
+        self.playback = asyncio.Queue()
+        self.pipeline_tasks = []
 
     async def listen(self, member):
         self.text_channel = member.voice.channel
         self.voice_channel = member.voice.channel
         if self.voice_channel is not None:
+            self.guild = str(member.guild.id)
+            self.start_transcription()
             self.voice_client = await self.voice_channel.connect(
                 cls=voice_recv.VoiceRecvClient
             )
             self.voice_client.listen(self.audio_sink)
-            print("Connected!")
+            logger.info("Connected to voice channel %s", self.voice_channel)
+
+    def start_transcription(self):
+        self.loop = asyncio.get_running_loop()
+        self.utterance_queue = UtteranceQueue(
+            self.loop,
+            self._transcribe,
+            maxsize=self.queue_size,
+            workers=self.transcription_workers,
+            overflow_policy=self.overflow_policy,
+        )
+        self.utterance_queue.start()
+        queue_sizes = {
+            "utterances": self._utterance_backlog,
+            "transcripts": self.transcripts.qsize,
+            "responses": self.responses.qsize,
+            "playback": self.playback.qsize,
+        }
+        for queue_name, size in queue_sizes.items():
+            QUEUE_DEPTH.labels(queue_name, self.guild).set_function(size)
 
-    def _transcribe(self, speaker, pcm_s16le):
+    def _utterance_backlog(self):
+        if self.utterance_queue is None:
+            return 0
+        return len(self.utterance_queue.pending)
+
+    def _enqueue_utterance(self, speaker, pcm_s16le):
+        self.stream_preroll.pop(speaker, None)
+        if self.streaming_stt and speaker in self.streams:
+            stream, _ = self.streams.pop(speaker)
+            if pcm_s16le is None:
+                # The detector rejected the burst, so nothing it heard counts.
+                stream.cancel()
+                return
+            self.stream_ends[stream] = time.perf_counter()
+            stream.close()
+            return
+        if not pcm_s16le or self.utterance_queue is None:
+            return
+        if self.audio_sink.caller_id and speaker != self.audio_sink.caller_id:
+            return
+        self.utterance_queue.put_threadsafe(speaker, pcm_s16le)
+
+    def _stream_frame(self, speaker, pcm_s16le):
+        if self.loop is None:
+            return
+        if self.wake_word_detector is not None and not self.audio_sink.caller_id:
+            # Idle chatter goes through the queue and the wake-word gate.
+            return
+        if speaker not in self.streams:
+            if not self.audio_sink.detectors[speaker].active:
+                # Hold the first voiced frames back until the detector starts
+                # an utterance, so a click never opens a recognition stream.
+                self.stream_preroll.setdefault(speaker, []).append(pcm_s16le)
+                return
+            stream = self.stream_transcriber(self.loop).start()
+            resampler = SpeechResampler(self.audio_sink.NUM_CHANNELS)
+            self.streams[speaker] = (stream, resampler)
+            self.loop.call_soon_threadsafe(
+                self.loop.create_task, self._consume_stream(speaker, stream)
+            )
+            for held_frame in self.stream_preroll.pop(speaker, []):
+                stream.feed(resampler.process(held_frame))
+        stream, resampler = self.streams[speaker]
+        stream.feed(resampler.process(pcm_s16le))
+
+    async def _consume_stream(self, speaker, stream):
+        final_parts = []
+        with track("stt_stream", self.guild):
+            async for transcript, is_final in stream:
+                if is_final:
+                    final_parts.append(transcript)
+        turn_started = self.stream_ends.pop(stream, time.perf_counter())
+        if stream.cancelled:
+            return
+        await self._handle_transcript(
+            speaker, " ".join(final_parts).strip(), turn_started
+        )
+
+    async def _transcribe(self, speaker, utterance, enqueued_at):
+        observe("queue_wait", time.perf_counter() - enqueued_at, self.guild)
         if self.audio_sink.caller_id:
             if speaker != self.audio_sink.caller_id:
                 return
-        message = self.transcriber(pcm_s16le)
-        print(f"{speaker} says: {message}")
-        if self.audio_sink.caller_id or any(
-            word in message for word in self.activate_words
-        ):
+        loop = asyncio.get_running_loop()
+        request = await loop.run_in_executor(None, self._prepare_utterance, utterance)
+        if request is None:
+            return
+        audio, options = request
+        async with self.stt_limiter:
+            with track("stt", self.guild):
+                message = await loop.run_in_executor(
+                    None, partial(self.transcriber, audio, **options)
+                )
+        await self._handle_transcript(speaker, message, enqueued_at)
+
+    def _prepare_utterance(self, utterance):
+        # Returns the transcriber's audio and keyword arguments, or None when
+        # the wake-word gate rejects the utterance.
+        channels = self.audio_sink.NUM_CHANNELS
+        gated = self.wake_word_detector is not None and not self.audio_sink.caller_id
+        if self.audio_sink.opus_passthrough:
+            packets = [packet for packet in utterance if packet]
+            # The original packets go to STT; decoding is only for the gate.
+            pcm_16k = downmix_resample(decode_opus(packets), channels) if gated else None
+            audio = mux_ogg_opus(packets, channels)
+            options = dict(
+                encoding="OGG_OPUS", sample_rate_hertz=48000, audio_channel_count=channels
+            )
+        else:
+            pcm_16k = downmix_resample(utterance, channels)
+            audio, options = pcm_16k, dict()
+        if gated and not self._heard_wake_word(pcm_16k):
+            return None
+        return audio, options
+
+    def _heard_wake_word(self, pcm_16k):
+        with track("wake_word", self.guild):
+            heard = self.wake_word_detector.detect(np.frombuffer(pcm_16k, dtype=np.int16))
+        WAKE_WORD_CHECKS.labels(self.guild, "passed" if heard else "rejected").inc()
+        if not heard:
+            logger.debug("No wake word heard, skipping transcription")
+        return heard
+
+    async def _handle_transcript(self, speaker, message, turn_started):
+        logger.debug("%s says: %s", speaker, message)
+        if not message:
+            return
+        if self.audio_sink.caller_id:
+            if speaker != self.audio_sink.caller_id:
+                return
+        elif any(word in message for word in self.activate_words):
             self.audio_sink.caller_id = speaker
-            self.messages.append((speaker, message))
+        else:
+            return
+        self.transcripts.put_nowait((speaker, message, turn_started))
 
     async def _send_message_to_channel(
         self, member, message
@@ -130,56 +581,237 @@ class AudioListener:
         )
         await self.text_channel.send(f"{speaker_nick} says: {message}")
 
-    async def _play_response_on_channel(self, voice_channel, response):
-        if voice_channel:
-            audio_data = self.synthesizer(response)
-            audio_source = discord.FFmpegPCMAudio(io.BytesIO(audio_data), pipe=True)
-            self.voice_client.play(audio_source)
-            while self.voice_client.is_playing():
-                await asyncio.sleep(1)
+    async def _play_response_on_channel(self, voice_channel, audio_source):
+        if voice_channel and self.voice_client is not None:
+            loop = asyncio.get_running_loop()
+            finished = loop.create_future()
+
+            def after(error):
+                loop.call_soon_threadsafe(self._finish_playback, finished, error)
+
+            if isinstance(audio_source, StreamingAudioSource):
+                await self._wait_preroll(audio_source)
+            with track("playback", self.guild):
+                self.voice_client.play(audio_source, after=after)
+                await finished
+            if isinstance(audio_source, StreamingAudioSource) and audio_source.underruns:
+                logger.debug(
+                    "Streaming playback filled %d frames with silence",
+                    audio_source.underruns,
+                )
+
+    async def _wait_preroll(self, audio_source):
+        if audio_source.ready.is_set():
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, audio_source.wait_ready, self.preroll_timeout
+        )
+
+    def _finish_playback(self, finished, error):
+        if error is not None:
+            logger.error("Playback failed: %s", error)
+        if not finished.done():
+            finished.set_result(None)
 
     def _get_context(self, message):
-        if self.chat_history:
-            self.chat_history.append({"role": "user", "content": message})
-        else:
-            context = [
-                {"role": "system", "content": self.vc_system_prompt},
-                {"role": "user", "content": message},
-            ]
-            self.chat_history = context
+        self.chat_history.add("user", message)
+
+    async def _summarize(self, messages):
+        with track("summary", self.guild):
+            return await self.language_model(messages)
+
+    def _strip_end_marker(self, response):
+        words = response.split()
+        if words and words[-1].strip(".!") == "True":
+            return (response.rsplit(None, 1)[0] if len(words) > 1 else ""), True
+        return response, False
+
+    def _end_conversation(self):
+        self.audio_sink.caller_id = None
+        self.chat_history.clear()
+        logger.info("Conversation ended")
 
     def _check_chat_status(self, response):
-        if response.split()[-1] == "True":
-            self.audio_sink.caller_id = None
-            self.chat_history = []
-            print("Conversation ended")
-            return response.rsplit(None, 1)[0]
-        else:
-            return response
+        response, ended = self._strip_end_marker(response)
+        if ended:
+            self._end_conversation()
+        return response
+
+    async def _stream_response(self, speaker, turn_started):
+        parts = []
+        ended = False
+        started = time.perf_counter()
+        async for sentence in aiter_sentences(
+            self.stream_language_model(self.chat_history.messages())
+        ):
+            if not parts:
+                observe("llm_first_sentence", time.perf_counter() - started, self.guild)
+            parts.append(sentence)
+            text, sentence_ended = self._strip_end_marker(sentence)
+            ended = ended or sentence_ended
+            if text:
+                await self.responses.put((speaker, text, turn_started))
+        return " ".join(parts), ended
 
-    async def message_sending_loop(self, guild, timeout=0.5):
+    async def _response_stage(self):
         while True:
-            if not guild or not self.messages:
-                await asyncio.sleep(timeout)
+            speaker, message, turn_started = await self.transcripts.get()
+            self._get_context(message)
+            if self.streaming_llm:
+                try:
+                    with track("llm", self.guild):
+                        response, ended = await self._stream_response(
+                            speaker, turn_started
+                        )
+                except Exception:
+                    logger.exception("Streaming language model request failed")
+                    continue
+                self.chat_history.add("assistant", response)
+                if ended:
+                    self._end_conversation()
                 continue
-            for speaker, message in self.messages:
-                # member = guild.get_member(speaker) # future transcriber feature
-                if message:
-                    self._get_context(message)
-                    response = self.language_model(self.chat_history)
-                    self.chat_history.append({"role": "assistant", "content": response})
-                    response = self._check_chat_status(response)
-                    await self._play_response_on_channel(self.voice_channel, response)
-            self.messages = []
+            try:
+                with track("llm", self.guild):
+                    response = await self.language_model(self.chat_history.messages())
+            except Exception:
+                logger.exception("Language model request failed")
+                continue
+            self.chat_history.add("assistant", response)
+            response = self._check_chat_status(response)
+            if response:
+                await self.responses.put((speaker, response, turn_started))
+
+    async def _synthesis_stage(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            speaker, response, turn_started = await self.responses.get()
+            try:
+                audio_source = self._cached_audio_source(response)
+            except Exception:
+                # A broken cache entry should not cost the answer: synthesize.
+                logger.exception("Cached speech synthesis failed")
+                audio_source = None
+            if audio_source is not None:
+                # Cache hit: no executor hop and no wait for the TTS limiter.
+                STAGE_REQUESTS.labels("tts", self.guild, "cached").inc()
+                await self.playback.put((audio_source, turn_started))
+                continue
+            if self.streaming_tts:
+                # Queued right away; playback starts once the pre-roll is in.
+                audio_source = StreamingAudioSource(preroll=self.preroll)
+                await self.playback.put((audio_source, turn_started))
+                try:
+                    async with self.tts_limiter:
+                        await loop.run_in_executor(
+                            None, self._stream_synthesis, response, audio_source
+                        )
+                except Exception:
+                    logger.exception("Streaming speech synthesis failed")
+                continue
+            try:
+                async with self.tts_limiter:
+                    audio_source = await loop.run_in_executor(
+                        None, self._synthesize, response
+                    )
+            except Exception:
+                logger.exception("Speech synthesis failed")
+                continue
+            await self.playback.put((audio_source, turn_started))
+
+    def _stream_synthesis(self, response, audio_source):
+        try:
+            with track("tts_stream", self.guild):
+                for chunk in self.stream_synthesizer(response):
+                    if audio_source.closed:
+                        break
+                    audio_source.feed(chunk)
+        finally:
+            audio_source.finish()
+
+    def _cached_audio_source(self, response):
+        # Memory tier only, so it is safe on the event loop.
+        if self.cached_synthesizer is None:
+            return None
+        audio_data = self.cached_synthesizer(response)
+        if audio_data is None:
+            return None
+        if is_ogg(audio_data):
+            return ogg_opus_source(audio_data, reframe=False)
+        if self.opus_cache is None:
+            return PCMAudioSource(audio_data)
+        packed = self.opus_cache.get(opus_cache_key(audio_data), memory_only=True)
+        if packed is None:
+            return None
+        return OpusAudioSource(unpack_opus_packets(packed))
+
+    def _synthesize(self, response):
+        with track("tts", self.guild):
+            audio_data = self.synthesizer(response)
+        if is_ogg(audio_data):
+            # Already Opus: demux the packets and send them as they are.
+            return ogg_opus_source(audio_data)
+        if self.opus_cache is None:
+            return PCMAudioSource(audio_data)
+        # Encode once here instead of frame by frame in the player thread, and
+        # keep the packets next to the cached speech for the next time.
+        key = opus_cache_key(audio_data)
+        packed = self.opus_cache.get(key)
+        if packed is None:
+            with track("opus_encode", self.guild):
+                packed = pack_opus_packets(encode_opus(audio_data))
+            self.opus_cache.put(key, packed)
+        return OpusAudioSource(unpack_opus_packets(packed))
+
+    async def _playback_stage(self):
+        last_turn = None
+        while True:
+            audio_source, turn_started = await self.playback.get()
+            if turn_started != last_turn:
+                observe("turn", time.perf_counter() - turn_started, self.guild)
+                last_turn = turn_started
+            try:
+                await self._play_response_on_channel(self.voice_channel, audio_source)
+            except Exception:
+                logger.exception("Playback failed")
+
+    async def message_sending_loop(self, guild):
+        # member = guild.get_member(speaker) # future transcriber feature
+        self.pipeline_tasks = [
+            asyncio.create_task(self._response_stage()),
+            asyncio.create_task(self._synthesis_stage()),
+            asyncio.create_task(self._playback_stage()),
+        ]
+        try:
+            await asyncio.gather(*self.pipeline_tasks)
+        except asyncio.CancelledError:
+            for task in self.pipeline_tasks:
+                task.cancel()
+            raise
 
     async def stop_listening(self):
         if self.voice_client is not None:
-            print("Attempting to hang up from voice channel")
+            logger.info("Attempting to hang up from voice channel")
             try:
                 self.voice_client.stop()
                 self.voice_client.stop_listening()
-            except Exception as e:
-                print(e)
+            except Exception:
+                logger.exception("Failed to stop voice client")
             await self.voice_client.disconnect()
             self.voice_client = None
-            print("Disconnected!")
+            logger.info("Disconnected from voice channel")
+        if self.utterance_queue is not None:
+            await self.utterance_queue.stop()
+            self.utterance_queue = None
+        for task in self.pipeline_tasks:
+            task.cancel()
+        self.pipeline_tasks = []
+        self.chat_history.clear()
+        self.audio_sink.cleanup()
+        for stream, _ in self.streams.values():
+            stream.close()
+        self.streams = dict()
+        self.stream_ends = dict()
+        self.stream_preroll = dict()
+        for queue_name in ("utterances", "transcripts", "responses", "playback"):
+            QUEUE_DEPTH.remove(queue_name, self.guild)
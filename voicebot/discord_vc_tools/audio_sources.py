@@ -0,0 +1,227 @@
+import hashlib
+import struct
+import threading
+from collections import deque
+
+import discord
+import numpy as np
+
+from discord_vc_tools.ogg import demux_ogg_opus
+from discord_vc_tools.opus_packets import packet_samples
+
+
+def read_wav(audio_data, default_sample_rate=48000, default_channels=1):
+    # Returns an int16 view over the data chunk; headerless input is raw PCM.
+    audio_data = memoryview(audio_data)
+    if bytes(audio_data[:4]) != b"RIFF" or bytes(audio_data[8:12]) != b"WAVE":
+        samples = np.frombuffer(audio_data, dtype=np.int16)
+        return samples, default_sample_rate, default_channels
+
+    sample_rate, channels = default_sample_rate, default_channels
+    offset = 12
+    while offset + 8 <= len(audio_data):
+        chunk_id = bytes(audio_data[offset : offset + 4])
+        (chunk_size,) = struct.unpack("<I", audio_data[offset + 4 : offset + 8])
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            channels, sample_rate = struct.unpack("<HI", audio_data[body + 2 : body + 8])
+        elif chunk_id == b"data":
+            end = min(body + chunk_size, len(audio_data))
+            end -= (end - body) % 2
+            samples = np.frombuffer(audio_data[body:end], dtype=np.int16)
+            return samples, sample_rate, channels
+        offset = body + chunk_size + (chunk_size % 2)
+    raise ValueError("WAV data chunk not found")
+
+
+class PCMAudioSource(discord.AudioSource):
+    FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+
+    def __init__(self, audio_data):
+        samples, sample_rate, channels = read_wav(audio_data)
+        if sample_rate != discord.opus.Encoder.SAMPLING_RATE:
+            raise ValueError(f"Unsupported sample rate: {sample_rate}")
+        if channels == 1:
+            samples = np.repeat(samples, discord.opus.Encoder.CHANNELS)
+        elif channels != discord.opus.Encoder.CHANNELS:
+            raise ValueError(f"Unsupported channel count: {channels}")
+        self.pcm = memoryview(samples).cast("B")
+        self.position = 0
+
+    def read(self):
+        frame = self.pcm[self.position : self.position + self.FRAME_SIZE]
+        self.position += self.FRAME_SIZE
+        if not frame:
+            return b""
+        # The opus encoder ctypes-casts its input, so hand it real bytes.
+        if len(frame) < self.FRAME_SIZE:
+            return bytes(frame) + bytes(self.FRAME_SIZE - len(frame))
+        return bytes(frame)
+
+    def is_opus(self):
+        return False
+
+
+def encode_opus(audio_data):
+    # One encoder per call: opus encoders are stateful and not thread-safe.
+    encoder = discord.opus.Encoder()
+    source = PCMAudioSource(audio_data)
+    packets = []
+    frame = source.read()
+    while frame:
+        packets.append(encoder.encode(frame, encoder.SAMPLES_PER_FRAME))
+        frame = source.read()
+    return packets
+
+
+def decode_opus(packets):
+    decoder = discord.opus.Decoder()
+    return b"".join(decoder.decode(packet, fec=False) for packet in packets)
+
+
+def reframe_opus(packets):
+    # Discord plays one packet per 20 ms, so other frame sizes are re-encoded.
+    encoder = discord.opus.Encoder()
+    pcm = decode_opus(packets)
+    pcm += bytes(-len(pcm) % encoder.FRAME_SIZE)
+    return [
+        encoder.encode(pcm[start : start + encoder.FRAME_SIZE], encoder.SAMPLES_PER_FRAME)
+        for start in range(0, len(pcm), encoder.FRAME_SIZE)
+    ]
+
+
+def ogg_opus_source(audio_data, reframe=True):
+    # None when the packets need re-encoding and reframe is off.
+    packets, _ = demux_ogg_opus(audio_data)
+    frame_samples = discord.opus.Encoder.SAMPLES_PER_FRAME
+    if any(packet_samples(packet) != frame_samples for packet in packets):
+        if not reframe:
+            return None
+        packets = reframe_opus(packets)
+    return OpusAudioSource(packets)
+
+
+def pack_opus_packets(packets):
+    return b"".join(struct.pack("<H", len(packet)) + packet for packet in packets)
+
+
+def unpack_opus_packets(data):
+    data = memoryview(data)
+    packets = []
+    offset = 0
+    while offset + 2 <= len(data):
+        (size,) = struct.unpack("<H", data[offset : offset + 2])
+        packets.append(bytes(data[offset + 2 : offset + 2 + size]))
+        offset += 2 + size
+    return packets
+
+
+def opus_cache_key(audio_data):
+    return "opus-" + hashlib.sha256(audio_data).hexdigest()
+
+
+class OpusAudioSource(discord.AudioSource):
+    # Pre-encoded 20 ms packets; the player thread sends them as they are.
+
+    def __init__(self, packets):
+        self.packets = packets
+        self.position = 0
+
+    def read(self):
+        if self.position >= len(self.packets):
+            return b""
+        packet = self.packets[self.position]
+        self.position += 1
+        return packet
+
+    def is_opus(self):
+        return True
+
+
+class StreamingAudioSource(discord.AudioSource):
+    # Jitter buffer between a streaming synthesizer (feed/finish, any thread)
+    # and the player thread (read). Input is 16-bit PCM at a rate dividing
+    # 48 kHz, upsampled by linear interpolation. ready is set once `preroll`
+    # seconds are buffered; an empty buffer before finish() plays silence, and
+    # a producer silent for stall_timeout seconds ends playback.
+
+    FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+    FRAME_SECONDS = 0.02
+
+    def __init__(self, sample_rate=24000, channels=1, preroll=0.2, stall_timeout=5.0):
+        if discord.opus.Encoder.SAMPLING_RATE % sample_rate:
+            raise ValueError(f"Unsupported sample rate: {sample_rate}")
+        self.factor = discord.opus.Encoder.SAMPLING_RATE // sample_rate
+        self.channels = channels
+        self.preroll_frames = max(1, int(preroll / self.FRAME_SECONDS))
+        self.stall_frames = int(stall_timeout / self.FRAME_SECONDS)
+        self.silence = bytes(self.FRAME_SIZE)
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.frames = deque()
+        self.pending = bytearray()
+        self.remainder = b""
+        self.last_sample = np.zeros(channels, dtype=np.float32)
+        self.finished = False
+        self.closed = False
+        self.underruns = 0
+        self.silent_run = 0
+
+    def _to_output(self, pcm):
+        pcm = self.remainder + pcm
+        usable = len(pcm) - len(pcm) % (2 * self.channels)
+        self.remainder = pcm[usable:]
+        samples = np.frombuffer(pcm[:usable], dtype=np.int16)
+        samples = samples.reshape(-1, self.channels).astype(np.float32)
+        if not len(samples):
+            return b""
+        previous = np.vstack((self.last_sample, samples[:-1]))
+        self.last_sample = samples[-1]
+        steps = np.arange(1, self.factor + 1, dtype=np.float32) / self.factor
+        upsampled = previous[:, None, :] + (samples - previous)[:, None, :] * steps[None, :, None]
+        upsampled = upsampled.reshape(-1, self.channels)
+        if self.channels == 1:
+            upsampled = np.repeat(upsampled, discord.opus.Encoder.CHANNELS, axis=1)
+        return upsampled.astype(np.int16).tobytes()
+
+    def feed(self, pcm):
+        output = self._to_output(pcm)
+        with self.lock:
+            self.pending += output
+            while len(self.pending) >= self.FRAME_SIZE:
+                self.frames.append(bytes(self.pending[: self.FRAME_SIZE]))
+                del self.pending[: self.FRAME_SIZE]
+            if len(self.frames) >= self.preroll_frames:
+                self.ready.set()
+
+    def finish(self):
+        with self.lock:
+            if self.pending:
+                self.pending += bytes(self.FRAME_SIZE - len(self.pending))
+                self.frames.append(bytes(self.pending))
+                self.pending = bytearray()
+            self.finished = True
+        self.ready.set()
+
+    def wait_ready(self, timeout=None):
+        return self.ready.wait(timeout)
+
+    def read(self):
+        with self.lock:
+            if self.frames:
+                self.silent_run = 0
+                return self.frames.popleft()
+            if self.finished or self.closed:
+                return b""
+        self.underruns += 1
+        self.silent_run += 1
+        if self.silent_run > self.stall_frames:
+            return b""
+        return self.silence
+
+    def is_opus(self):
+        return False
+
+    def cleanup(self):
+        self.closed = True
+        self.ready.set()
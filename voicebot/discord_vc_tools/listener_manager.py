@@ -0,0 +1,109 @@
+import asyncio
+import logging
+
+from discord_vc_tools.audio_api import AudioListener
+from monitoring.metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+VOICE_SESSIONS = Gauge("voicebot_voice_sessions", "Active voice listening sessions.")
+
+
+class SessionLimitReached(Exception):
+    pass
+
+
+class ListenerManager:
+    # One AudioListener per guild (a bot can only hold one voice connection per
+    # guild), each with its own sink, chat history and pipeline tasks. Provider
+    # clients are module-level and shared; the STT and TTS semaphores here cap
+    # executor work across all sessions. Starting and stopping is serialized
+    # per guild, so a slow voice connect in one guild never blocks another.
+
+    def __init__(
+        self,
+        max_sessions=32,
+        stt_concurrency=16,
+        tts_concurrency=16,
+        listener_factory=AudioListener,
+        **listener_options,
+    ):
+        self.max_sessions = max_sessions
+        self.stt_concurrency = stt_concurrency
+        self.tts_concurrency = tts_concurrency
+        self.listener_factory = listener_factory
+        self.listener_options = listener_options
+        self.listeners = dict()
+        self.pipelines = dict()
+        self.guild_locks = dict()
+        self.stt_limiter = None
+        self.tts_limiter = None
+        VOICE_SESSIONS.labels().set_function(lambda: len(self.listeners))
+
+    def _ensure_limits(self):
+        # Created on first use so they bind to the bot's running loop.
+        if self.stt_limiter is None:
+            self.stt_limiter = asyncio.Semaphore(self.stt_concurrency)
+            self.tts_limiter = asyncio.Semaphore(self.tts_concurrency)
+
+    def get(self, guild_id):
+        return self.listeners.get(guild_id)
+
+    def _guild_lock(self, guild_id):
+        lock = self.guild_locks.get(guild_id)
+        if lock is None:
+            lock = self.guild_locks[guild_id] = asyncio.Lock()
+        return lock
+
+    async def start(self, member):
+        self._ensure_limits()
+        guild_id = member.guild.id
+        channel = member.voice.channel
+        async with self._guild_lock(guild_id):
+            listener = self.listeners.get(guild_id)
+            if listener is not None:
+                if listener.voice_channel == channel:
+                    return listener
+                await self._stop(guild_id)
+            # No await between this check and the insert below, so the limit
+            # holds across guilds without a global lock.
+            if len(self.listeners) >= self.max_sessions:
+                raise SessionLimitReached(
+                    f"Already serving {self.max_sessions} voice sessions"
+                )
+            listener = self.listener_factory(
+                stt_limiter=self.stt_limiter,
+                tts_limiter=self.tts_limiter,
+                **self.listener_options,
+            )
+            self.listeners[guild_id] = listener
+            self.pipelines[guild_id] = asyncio.create_task(
+                listener.message_sending_loop(member.guild)
+            )
+            try:
+                await listener.listen(member)
+            except Exception:
+                await self._stop(guild_id)
+                raise
+            logger.info("Started voice session in guild %s", guild_id)
+            return listener
+
+    async def stop(self, guild_id):
+        self._ensure_limits()
+        async with self._guild_lock(guild_id):
+            return await self._stop(guild_id)
+
+    async def _stop(self, guild_id):
+        listener = self.listeners.pop(guild_id, None)
+        pipeline = self.pipelines.pop(guild_id, None)
+        if listener is None:
+            return False
+        await listener.stop_listening()
+        if pipeline is not None:
+            pipeline.cancel()
+            await asyncio.gather(pipeline, return_exceptions=True)
+        logger.info("Stopped voice session in guild %s", guild_id)
+        return True
+
+    async def stop_all(self):
+        await asyncio.gather(*(self.stop(guild_id) for guild_id in list(self.listeners)))
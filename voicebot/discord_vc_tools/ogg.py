@@ -0,0 +1,121 @@
+import os
+import struct
+
+from discord_vc_tools.opus_packets import packet_samples
+
+# Minimal Ogg muxer/demuxer for Opus (RFC 3533 pages, RFC 7845 headers):
+# enough to hand a speaker's original Discord packets to speech recognition as
+# OGG_OPUS and to play OGG_OPUS speech synthesis without decoding it.
+
+
+def _crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else crc << 1
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+CRC_TABLE = _crc_table()
+BOS = 0x02
+EOS = 0x04
+MAX_SEGMENTS = 255
+PACKETS_PER_PAGE = 50  # about one second of 20 ms packets
+
+
+def ogg_crc(data):
+    crc = 0
+    table = CRC_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ table[(crc >> 24) ^ byte]
+    return crc
+
+
+def lacing(packet):
+    return bytes([255] * (len(packet) // 255) + [len(packet) % 255])
+
+
+def ogg_page(packets, serial, sequence, granule, header_type=0):
+    segments = b"".join(lacing(packet) for packet in packets)
+    header = struct.pack(
+        "<4sBBqIIIB", b"OggS", 0, header_type, granule, serial, sequence, 0, len(segments)
+    )
+    page = bytearray(header + segments + b"".join(packets))
+    struct.pack_into("<I", page, 22, ogg_crc(page))
+    return bytes(page)
+
+
+def opus_head(channels, pre_skip=0, input_sample_rate=48000):
+    return struct.pack(
+        "<8sBBHIhB", b"OpusHead", 1, channels, pre_skip, input_sample_rate, 0, 0
+    )
+
+
+def opus_tags(vendor=b"voicebot"):
+    return b"OpusTags" + struct.pack("<I", len(vendor)) + vendor + struct.pack("<I", 0)
+
+
+def mux_ogg_opus(packets, channels=2, serial=None):
+    packets = [packet for packet in packets if packet]
+    if not packets:
+        return b""
+    serial = serial if serial is not None else struct.unpack("<I", os.urandom(4))[0]
+    pages = [
+        ogg_page([opus_head(channels)], serial, 0, 0, BOS),
+        ogg_page([opus_tags()], serial, 1, 0),
+    ]
+    granule = 0
+    page_packets = []
+    page_segments = 0
+    for index, packet in enumerate(packets):
+        segments = len(packet) // 255 + 1
+        if page_packets and (
+            page_segments + segments > MAX_SEGMENTS
+            or len(page_packets) >= PACKETS_PER_PAGE
+        ):
+            pages.append(ogg_page(page_packets, serial, len(pages), granule))
+            page_packets = []
+            page_segments = 0
+        page_packets.append(packet)
+        page_segments += segments
+        granule += packet_samples(packet)
+    pages.append(ogg_page(page_packets, serial, len(pages), granule, EOS))
+    return b"".join(pages)
+
+
+def is_ogg(data):
+    return bytes(data[:4]) == b"OggS"
+
+
+def demux_ogg_opus(data):
+    # Returns the audio packets of the first logical stream and its channel
+    # count. CRCs are not checked; the data comes over TLS.
+    data = memoryview(data)
+    packets = []
+    chunks = []
+    serial = None
+    offset = 0
+    while offset + 27 <= len(data):
+        if bytes(data[offset : offset + 4]) != b"OggS":
+            raise ValueError("Ogg capture pattern not found")
+        (page_serial,) = struct.unpack_from("<I", data, offset + 14)
+        segment_count = data[offset + 26]
+        segments = data[offset + 27 : offset + 27 + segment_count]
+        position = offset + 27 + segment_count
+        offset = position + sum(segments)
+        if serial is None:
+            serial = page_serial
+        elif page_serial != serial:
+            continue
+        for size in segments:
+            chunks.append(data[position : position + size])
+            position += size
+            if size < 255:
+                packets.append(b"".join(chunks))
+                chunks = []
+    if len(packets) < 2 or not packets[0].startswith(b"OpusHead"):
+        raise ValueError("Not an Ogg Opus stream")
+    channels = packets[0][9]
+    return [packet for packet in packets[2:] if packet], channels
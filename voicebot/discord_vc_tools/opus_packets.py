@@ -0,0 +1,41 @@
+import numpy as np
+
+# Cheap inspection of raw Opus packets (RFC 6716, section 3.1), so silence can
+# be recognized without running the decoder.
+
+OPUS_SILENCE = b"\xf8\xff\xfe"  # what Discord clients send once a user stops
+SILENT_BYTES_PER_FRAME = 8  # DTX and comfort-noise frames stay below this
+
+
+def frame_count(packet):
+    code = packet[0] & 0x03
+    if code == 0:
+        return 1
+    if code in (1, 2):
+        return 2
+    return packet[1] & 0x3F if len(packet) > 1 else 0
+
+
+def packet_samples(packet, sample_rate=48000):
+    # Duration from the TOC config: SILK 10-60 ms, hybrid 10-20 ms, CELT 2.5-20 ms.
+    config = packet[0] >> 3
+    if config < 12:
+        frame_ms = (10, 20, 40, 60)[config % 4]
+    elif config < 16:
+        frame_ms = (10, 20)[config % 2]
+    else:
+        frame_ms = (2.5, 5, 10, 20)[config % 4]
+    return int(frame_count(packet) * frame_ms * sample_rate / 1000)
+
+
+def is_silent_packet(packet, max_bytes_per_frame=SILENT_BYTES_PER_FRAME):
+    if not packet or packet == OPUS_SILENCE:
+        return True
+    frames = frame_count(packet)
+    if frames == 0:
+        return True
+    return (len(packet) - 1) / frames <= max_bytes_per_frame
+
+
+def silent_frame(samples, channels):
+    return np.zeros((samples, channels), dtype=np.int16)
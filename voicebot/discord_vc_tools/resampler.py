@@ -0,0 +1,39 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def lowpass_taps(numtaps, factor):
+    cutoff = 0.45 / factor
+    n = np.arange(numtaps) - (numtaps - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(numtaps)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+class SpeechResampler:
+    # Downmixes interleaved int16 PCM to mono and decimates it by an integer
+    # factor (48 kHz -> 16 kHz by default). Only every factor-th output of the
+    # FIR filter is computed, and filter state is carried between calls so
+    # frames can be streamed through one at a time.
+
+    def __init__(self, channels=2, factor=3, numtaps=48):
+        self.channels = channels
+        self.factor = factor
+        self.numtaps = numtaps
+        self.kernel = lowpass_taps(numtaps, factor)[::-1].copy()
+        self.history = np.zeros(numtaps - 1, dtype=np.float32)
+
+    def process(self, pcm_s16le):
+        samples = np.frombuffer(pcm_s16le, dtype=np.int16).reshape(-1, self.channels)
+        mono = samples.mean(axis=1, dtype=np.float32)
+        signal = np.concatenate((self.history, mono))
+        count = (len(signal) - (self.numtaps - 1)) // self.factor
+        windows = sliding_window_view(signal, self.numtaps)[
+            : count * self.factor : self.factor
+        ]
+        resampled = windows @ self.kernel
+        self.history = signal[count * self.factor :]
+        return np.clip(np.rint(resampled), -32768, 32767).astype(np.int16).tobytes()
+
+
+def downmix_resample(pcm_s16le, channels=2, factor=3):
+    return SpeechResampler(channels, factor).process(pcm_s16le)
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+MERGE = "merge"
+
+logger = logging.getLogger(__name__)
+
+
+class UtteranceQueue:
+    # Workers run different speakers in parallel, but one speaker's utterances
+    # are handled one at a time, in the order they were spoken.
+
+    def __init__(self, loop, handler, maxsize=8, workers=2, overflow_policy=MERGE):
+        if overflow_policy not in (DROP_OLDEST, DROP_NEWEST, MERGE):
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.loop = loop
+        self.handler = handler
+        self.maxsize = maxsize
+        self.worker_count = workers
+        self.overflow_policy = overflow_policy
+        self.pending = deque()
+        self.not_empty = asyncio.Event()
+        self.workers = []
+        self.busy = set()
+        self.dropped = 0
+        self.merged = 0
+
+    def start(self):
+        for _ in range(self.worker_count):
+            self.workers.append(self.loop.create_task(self._worker()))
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        self.pending.clear()
+        self.busy.clear()
+
+    def put_threadsafe(self, speaker, pcm_s16le):
+        # Called from the voice_recv packet thread, never blocks it.
+        self.loop.call_soon_threadsafe(self.put_nowait, speaker, pcm_s16le)
+
+    def put_nowait(self, speaker, pcm_s16le):
+        if len(self.pending) >= self.maxsize and not self._handle_overflow(
+            speaker, pcm_s16le
+        ):
+            return
+        self.pending.append((speaker, pcm_s16le, time.perf_counter()))
+        self.not_empty.set()
+
+    def _handle_overflow(self, speaker, pcm_s16le):
+        if self.overflow_policy == MERGE:
+            for index in range(len(self.pending) - 1, -1, -1):
+                queued_speaker, queued_pcm, enqueued_at = self.pending[index]
+                if queued_speaker == speaker:
+                    self.pending[index] = (speaker, queued_pcm + pcm_s16le, enqueued_at)
+                    self.merged += 1
+                    logger.warning("Utterance queue full, merged segment for user %s", speaker)
+                    return False
+        self.dropped += 1
+        logger.warning("Utterance queue full, dropping a segment (%s)", self.overflow_policy)
+        if self.overflow_policy == DROP_NEWEST:
+            return False
+        self.pending.popleft()
+        return True
+
+    def _next_item(self):
+        # Oldest utterance of a speaker who has none in flight.
+        for index, item in enumerate(self.pending):
+            if item[0] not in self.busy:
+                del self.pending[index]
+                return item
+        return None
+
+    async def _worker(self):
+        while True:
+            item = self._next_item()
+            while item is None:
+                self.not_empty.clear()
+                await self.not_empty.wait()
+                item = self._next_item()
+            speaker, pcm_s16le, enqueued_at = item
+            self.busy.add(speaker)
+            try:
+                await self.handler(speaker, pcm_s16le, enqueued_at)
+            except Exception:
+                logger.exception("Transcription failed for user %s", speaker)
+            finally:
+                self.busy.discard(speaker)
+                if self.pending:
+                    # Wake a worker for this speaker's next utterance.
+                    self.not_empty.set()
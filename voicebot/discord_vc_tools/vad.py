@@ -0,0 +1,100 @@
+import math
+
+import numpy as np
+
+from discord_vc_tools.opus_packets import is_silent_packet
+
+
+VAD_IDLE = 0
+VAD_ACTIVE = 1
+VAD_END = 2
+
+
+class VoiceActivityDetector:
+    # One instance per speaker. update() classifies a 20 ms frame and returns
+    # VAD_ACTIVE while the frame belongs to a (candidate) utterance, VAD_END
+    # when an utterance of at least min_speech_frames voiced frames has just
+    # finished, and VAD_IDLE otherwise (including rejected short bursts).
+    #
+    # The hangover (280 ms) bridges the pauses between words so a phrase stays
+    # one utterance; when the RTP stream goes quiet, the sink's gap timer ends
+    # speech instead.
+
+    def __init__(
+        self,
+        start_ratio=4.0,
+        continue_ratio=2.0,
+        min_rms=50.0,
+        max_zcr=0.35,
+        start_frames=2,
+        hangover_frames=14,
+        min_speech_frames=10,
+        noise_adaptation=0.05,
+    ):
+        self.start_ratio = start_ratio
+        self.continue_ratio = continue_ratio
+        self.min_energy = min_rms**2
+        self.max_zcr = max_zcr
+        self.start_frames = start_frames
+        self.hangover_frames = hangover_frames
+        self.min_speech_frames = min_speech_frames
+        self.noise_adaptation = noise_adaptation
+        self.noise_floor = self.min_energy
+        self.reset()
+
+    def reset(self):
+        self.active = False
+        self.voiced_run = 0
+        self.voiced_frames = 0
+        self.silent_run = 0
+
+    def frame_features(self, frame):
+        mono = frame.mean(axis=1, dtype=np.float32) if frame.ndim == 2 else frame
+        energy = float(np.dot(mono, mono)) / len(mono)
+        signs = np.signbit(mono)
+        zcr = np.count_nonzero(signs[1:] != signs[:-1]) / len(mono)
+        return energy, zcr
+
+    def is_voiced(self, energy, zcr):
+        ratio = self.continue_ratio if self.active else self.start_ratio
+        threshold = max(self.noise_floor * ratio, self.min_energy)
+        return energy > threshold and zcr < self.max_zcr
+
+    def update(self, frame):
+        energy, zcr = self.frame_features(frame)
+        voiced = self.is_voiced(energy, zcr)
+
+        if not voiced and not self.active:
+            self.noise_floor += self.noise_adaptation * (energy - self.noise_floor)
+            self.noise_floor = max(self.noise_floor, self.min_energy)
+
+        if voiced:
+            self.voiced_run += 1
+            self.voiced_frames += 1
+            self.silent_run = 0
+            if self.voiced_run >= self.start_frames:
+                self.active = True
+            return VAD_ACTIVE
+
+        self.voiced_run = 0
+        if not self.active:
+            self.reset()
+            return VAD_IDLE
+
+        self.silent_run += 1
+        if self.silent_run <= self.hangover_frames:
+            return VAD_ACTIVE
+        return self.finish()
+
+    def finish(self):
+        long_enough = self.active and self.voiced_frames >= self.min_speech_frames
+        self.reset()
+        return VAD_END if long_enough else VAD_IDLE
+
+
+class PacketActivityDetector(VoiceActivityDetector):
+    # Same state machine over raw Opus packets: Discord clients gate on their
+    # own voice activity, so any packet that is not silence/DTX is speech.
+
+    def frame_features(self, packet):
+        return (0.0 if is_silent_packet(packet) else math.inf), 0.0
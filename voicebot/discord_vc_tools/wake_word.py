@@ -0,0 +1,196 @@
+import logging
+import os
+import threading
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from discord_vc_tools.audio_sources import read_wav
+from discord_vc_tools.resampler import SpeechResampler
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+FRAME_LENGTH = 400  # 25 ms
+FRAME_HOP = 160  # 10 ms
+FFT_SIZE = 512
+MEL_BANDS = 26
+CEPSTRA = 13
+
+
+def mel_filterbank(bands=MEL_BANDS, fft_size=FFT_SIZE, sample_rate=SAMPLE_RATE, low=60, high=7600):
+    def to_mel(hz):
+        return 2595 * np.log10(1 + hz / 700)
+
+    def to_hz(mel):
+        return 700 * (10 ** (mel / 2595) - 1)
+
+    edges = to_hz(np.linspace(to_mel(low), to_mel(high), bands + 2))
+    bins = np.floor((fft_size + 1) * edges / sample_rate).astype(int)
+    filters = np.zeros((bands, fft_size // 2 + 1), dtype=np.float32)
+    for band in range(bands):
+        left, center, right = bins[band], bins[band + 1], bins[band + 2]
+        filters[band, left:center] = (np.arange(left, center) - left) / max(center - left, 1)
+        filters[band, center:right] = (right - np.arange(center, right)) / max(right - center, 1)
+    return filters
+
+
+def dct_matrix(bands=MEL_BANDS, cepstra=CEPSTRA):
+    n = np.arange(bands)
+    k = np.arange(cepstra)[:, None]
+    matrix = np.cos(np.pi * k * (2 * n + 1) / (2 * bands)) * np.sqrt(2 / bands)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+
+FILTERBANK = mel_filterbank()
+DCT = dct_matrix()
+WINDOW = np.hamming(FRAME_LENGTH).astype(np.float32)
+
+
+def mfcc(samples, trim_silence=False):
+    # samples: 16 kHz mono int16. Returns (frames, CEPSTRA - 1); c0 is dropped
+    # so loudness does not matter.
+    signal = samples.astype(np.float32)
+    if len(signal) < FRAME_LENGTH:
+        return np.zeros((0, CEPSTRA - 1), dtype=np.float32)
+    signal[1:] -= 0.97 * signal[:-1]
+    frames = sliding_window_view(signal, FRAME_LENGTH)[::FRAME_HOP] * WINDOW
+    power = np.abs(np.fft.rfft(frames, FFT_SIZE)) ** 2 / FFT_SIZE
+    mel_energy = power @ FILTERBANK.T
+    frame_energy = mel_energy.sum(axis=1)
+    voiced = frame_energy > frame_energy.max() * 1e-3
+    if not voiced.any():
+        return np.zeros((0, CEPSTRA - 1), dtype=np.float32)
+    if trim_silence:
+        span = np.flatnonzero(voiced)
+        mel_energy = mel_energy[span[0] : span[-1] + 1]
+        voiced = voiced[span[0] : span[-1] + 1]
+    # A floor 20 dB under the loudest band keeps near-silent spectral valleys of
+    # clean TTS templates comparable with the same valleys filled by mic noise.
+    floor = mel_energy.max() * 1e-2 + 1e-6
+    features = (np.log(np.maximum(mel_energy, floor)) @ DCT.T)[:, 1:]
+    # Mean over voiced frames only, so leading/trailing silence in an
+    # utterance does not shift it away from the trimmed templates.
+    return features - features[voiced].mean(axis=0)
+
+
+def subsequence_dtw(template, utterance):
+    # Best average frame distance of the template matched anywhere inside the
+    # utterance. Steps (1,1), (1,2) and (1,0), with no two (1,0) steps in a
+    # row, let the word be spoken at half to double the template's speed and
+    # keep every row vectorized. stayed holds paths whose last step was (1,0).
+    if len(utterance) == 0 or len(template) == 0:
+        return np.inf
+    distances = np.sqrt(
+        ((template[:, None, :] - utterance[None, :, :]) ** 2).sum(axis=2)
+    )
+    moved = distances[0].copy()
+    stayed = np.full_like(moved, np.inf)
+    for row in distances[1:]:
+        cost = np.minimum(moved, stayed)
+        diagonal = np.concatenate(([np.inf], cost[:-1]))
+        skip = np.concatenate(([np.inf, np.inf], cost[:-2]))
+        moved, stayed = row + np.minimum(diagonal, skip), row + moved
+    return float(np.minimum(moved, stayed).min()) / len(template)
+
+
+class WakeWordDetector:
+    # Local keyword spotting in front of cloud STT. Until templates exist
+    # every utterance passes, so nothing is missed while they are being built.
+
+    def __init__(self, threshold=None, margin=1.5):
+        self.threshold = threshold
+        self.margin = margin
+        self.templates = []
+        self.groups = []
+        self.calibrated_threshold = None
+        self.lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return bool(self.templates) and self.current_threshold() is not None
+
+    def add_template(self, samples_16k, group=None):
+        # group: the voice that spoke the template; calibration only compares
+        # templates across voices.
+        features = mfcc(samples_16k, trim_silence=True)
+        if len(features) < 5:
+            return
+        with self.lock:
+            self.templates = self.templates + [features]
+            self.groups = self.groups + [group]
+
+    def add_wav_template(self, audio_data, group=None):
+        samples, sample_rate, channels = read_wav(audio_data)
+        if sample_rate % SAMPLE_RATE:
+            raise ValueError(f"Unsupported template sample rate: {sample_rate}")
+        resampler = SpeechResampler(channels, sample_rate // SAMPLE_RATE)
+        pcm_16k = resampler.process(samples.tobytes())
+        self.add_template(np.frombuffer(pcm_16k, dtype=np.int16), group)
+
+    def calibrate(self):
+        # Different voices saying the wake word bound how far a genuine match
+        # from an unseen speaker can be from its nearest template.
+        if self.threshold is not None:
+            return
+        nearest = []
+        for template, group in zip(self.templates, self.groups):
+            distances = [
+                subsequence_dtw(template, other)
+                for other, other_group in zip(self.templates, self.groups)
+                if other is not template and (group is None or other_group != group)
+            ]
+            if distances:
+                nearest.append(min(distances))
+        if not nearest:
+            return
+        self.calibrated_threshold = max(nearest) * self.margin
+        logger.info(
+            "Wake word threshold calibrated to %.2f from %d templates",
+            self.calibrated_threshold,
+            len(self.templates),
+        )
+
+    def current_threshold(self):
+        if self.threshold is not None:
+            return self.threshold
+        return self.calibrated_threshold
+
+    def score(self, samples_16k):
+        features = mfcc(samples_16k)
+        templates = self.templates
+        return min(subsequence_dtw(template, features) for template in templates)
+
+    def detect(self, samples_16k):
+        if not self.ready:
+            return True
+        score = self.score(samples_16k)
+        threshold = self.current_threshold()
+        # Logged for every utterance so a bad threshold can be tuned from logs.
+        logger.debug("Wake word score %.2f, threshold %.2f", score, threshold)
+        return score <= threshold
+
+
+def synthesize_templates(detector, synthesizer, phrases, voices, speaking_rates=(0.95, 1.15)):
+    # Build templates from our own TTS: several voices and rates per phrase.
+    for phrase in phrases:
+        for voice in voices:
+            for rate in speaking_rates:
+                try:
+                    audio = synthesizer(phrase, voice_name=voice, speaking_rate=rate)
+                    detector.add_wav_template(audio, group=voice)
+                except Exception:
+                    logger.exception("Could not synthesize wake word template %s", voice)
+    detector.calibrate()
+
+
+def load_templates(detector, directory):
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(".wav"):
+            try:
+                with open(os.path.join(directory, name), "rb") as template:
+                    detector.add_wav_template(template.read())
+            except Exception:
+                logger.exception("Could not load wake word template %s", name)
+    detector.calibrate()
@@ -1,41 +1,215 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+
+import grpc
 from google.cloud import speech_v1
 from google.cloud import texttospeech
+from google.cloud.speech_v1.services.speech.transports import SpeechGrpcTransport
+from google.cloud.texttospeech_v1.services.text_to_speech.transports import TextToSpeechGrpcTransport
+
+from gcloud_api.tts_cache import TTSCache, cache_key
 
 # Authorize credentials via command: gcloud auth login
 
-def gcloud_tts(text):
+logger = logging.getLogger(__name__)
+
+
+class GcloudProvider:
+	# Owns one long-lived gRPC channel per API instead of a client per call.
+
+	def __init__(self, keepalive_time_ms=30000, keepalive_timeout_ms=10000):
+		self.channel_options = [
+			("grpc.keepalive_time_ms", keepalive_time_ms),
+			("grpc.keepalive_timeout_ms", keepalive_timeout_ms),
+			("grpc.keepalive_permit_without_calls", 1),
+			("grpc.http2.max_pings_without_data", 0),
+		]
+		self.lock = threading.Lock()
+		self._speech_client = None
+		self._tts_client = None
+
+	@property
+	def speech_client(self):
+		with self.lock:
+			if self._speech_client is None:
+				channel = SpeechGrpcTransport.create_channel(options=self.channel_options)
+				self._speech_client = speech_v1.SpeechClient(transport=SpeechGrpcTransport(channel=channel))
+			return self._speech_client
+
+	@property
+	def tts_client(self):
+		with self.lock:
+			if self._tts_client is None:
+				channel = TextToSpeechGrpcTransport.create_channel(options=self.channel_options)
+				self._tts_client = texttospeech.TextToSpeechClient(transport=TextToSpeechGrpcTransport(channel=channel))
+			return self._tts_client
+
+	def warm_up(self, timeout=10):
+		# Resolves credentials and opens both channels before the first utterance.
+		self.tts_client.list_voices(language_code="pl-PL", timeout=timeout)
+		grpc.channel_ready_future(self.speech_client.transport.grpc_channel).result(timeout=timeout)
+
+
+gcloud_provider = GcloudProvider()
+tts_cache = TTSCache(
+	max_bytes=int(os.getenv("TTS_CACHE_MB", "64")) * 1024 * 1024,
+	directory=os.getenv("TTS_CACHE_DIR"),
+	max_disk_bytes=int(os.getenv("TTS_CACHE_DIR_MB", "512")) * 1024 * 1024,
+)
+
+
+def _tts_request(text, voice_name, speaking_rate, encoding):
 	
-	client = texttospeech.TextToSpeechClient()
 	input_text = texttospeech.SynthesisInput(text=text)
-	voice = texttospeech.VoiceSelectionParams(language_code="pl-PL", name="pl-PL-Standard-B")
+	voice = texttospeech.VoiceSelectionParams(language_code="pl-PL", name=voice_name)
 
 	audio_config = texttospeech.AudioConfig(
-		audio_encoding=texttospeech.AudioEncoding.LINEAR16,
+		audio_encoding=texttospeech.AudioEncoding[encoding],
 		sample_rate_hertz=48000,
 		pitch=-3,
-		speaking_rate=1.15,
+		speaking_rate=speaking_rate,
 		effects_profile_id=["headphone-class-device"]
 		)
 
+	key = cache_key(
+		text,
+		texttospeech.VoiceSelectionParams.serialize(voice),
+		texttospeech.AudioConfig.serialize(audio_config),
+	)
+	return input_text, voice, audio_config, key
+
+
+def gcloud_tts(text, voice_name="pl-PL-Standard-B", speaking_rate=1.15, encoding="LINEAR16"):
+	# encoding="OGG_OPUS" downloads compressed speech that plays without decoding.
+	
+	input_text, voice, audio_config, key = _tts_request(text, voice_name, speaking_rate, encoding)
+	audio_bytes = tts_cache.get(key)
+	if audio_bytes is not None:
+		return audio_bytes
+
+	client = gcloud_provider.tts_client
 	response = client.synthesize_speech(input=input_text, voice=voice, audio_config=audio_config)
 	audio_bytes = response.audio_content
+	tts_cache.put(key, audio_bytes)
 	
 	return audio_bytes
 
 
-def gcloud_stt(audio_data):
+def gcloud_tts_cached(text, voice_name="pl-PL-Standard-B", speaking_rate=1.15, encoding="LINEAR16"):
+	# Memory tier only, cheap enough to call on the event loop; None on a miss.
+	_, _, _, key = _tts_request(text, voice_name, speaking_rate, encoding)
+	return tts_cache.get(key, memory_only=True)
+
+
+def gcloud_tts_stream(text, voice_name="pl-PL-Chirp3-HD-Charon"):
+	# Streaming synthesis (Chirp 3 HD voices) yields raw LINEAR16 24 kHz mono
+	# chunks while the rest of the sentence is still being synthesized.
+	client = gcloud_provider.tts_client
+	config = texttospeech.StreamingSynthesizeConfig(
+		voice=texttospeech.VoiceSelectionParams(language_code="pl-PL", name=voice_name)
+	)
+
+	def requests():
+		yield texttospeech.StreamingSynthesizeRequest(streaming_config=config)
+		yield texttospeech.StreamingSynthesizeRequest(input=texttospeech.StreamingSynthesisInput(text=text))
+
+	for response in client.streaming_synthesize(requests()):
+		if response.audio_content:
+			yield response.audio_content
+
+
+def gcloud_stt(audio_data, sample_rate_hertz=16000, audio_channel_count=1, encoding="LINEAR16"):
 	
-	client = speech_v1.SpeechClient()	
+	client = gcloud_provider.speech_client
 	audio = speech_v1.RecognitionAudio(content=audio_data)
 	
 	config = speech_v1.RecognitionConfig(
-		encoding='LINEAR16',
-		sample_rate_hertz=48000,
+		encoding=encoding,
+		sample_rate_hertz=sample_rate_hertz,
 		language_code='pl-PL',
-		audio_channel_count=2,
+		audio_channel_count=audio_channel_count,
 	)
 
 	response = client.recognize(config=config, audio=audio)
 	text = response.results[0].alternatives[0].transcript if len(response.results) > 0 else ''
 
-	return text
\ No newline at end of file
+	return text
+
+
+class GcloudStreamingRecognizer:
+	# Feed PCM from any thread, iterate (transcript, is_final) on the event loop.
+
+	def __init__(self, loop, sample_rate_hertz=16000, audio_channel_count=1, interim_results=True):
+		self.loop = loop
+		self.config = speech_v1.StreamingRecognitionConfig(
+			config=speech_v1.RecognitionConfig(
+				encoding='LINEAR16',
+				sample_rate_hertz=sample_rate_hertz,
+				language_code='pl-PL',
+				audio_channel_count=audio_channel_count,
+			),
+			interim_results=interim_results,
+		)
+		self.chunks = queue.Queue()
+		self.results = None
+		self.cancelled = False
+		self.thread = threading.Thread(target=self._run, daemon=True)
+
+	def start(self):
+		self.thread.start()
+		return self
+
+	def feed(self, pcm_s16le):
+		self.chunks.put(pcm_s16le)
+
+	def close(self):
+		self.chunks.put(None)
+
+	def cancel(self):
+		# Ends the stream without results: iteration stops with nothing yielded.
+		self.cancelled = True
+		self.close()
+
+	def _requests(self):
+		while True:
+			chunk = self.chunks.get()
+			if chunk is None:
+				return
+			yield speech_v1.StreamingRecognizeRequest(audio_content=chunk)
+
+	def _run(self):
+		try:
+			client = gcloud_provider.speech_client
+			responses = client.streaming_recognize(config=self.config, requests=self._requests())
+			for response in responses:
+				if self.cancelled:
+					break
+				for result in response.results:
+					if result.alternatives:
+						item = (result.alternatives[0].transcript, result.is_final)
+						self.loop.call_soon_threadsafe(self._push, item)
+		except Exception:
+			logger.exception("Streaming recognition failed")
+		finally:
+			self.loop.call_soon_threadsafe(self._push, None)
+
+	def _results_queue(self):
+		# Created lazily on the loop thread, asyncio.Queue binds to a loop on 3.9.
+		if self.results is None:
+			self.results = asyncio.Queue()
+		return self.results
+
+	def _push(self, item):
+		self._results_queue().put_nowait(item)
+
+	def __aiter__(self):
+		return self
+
+	async def __anext__(self):
+		item = await self._results_queue().get()
+		if item is None or self.cancelled:
+			raise StopAsyncIteration
+		return item
@@ -0,0 +1,163 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(text, *request_parts):
+    # request_parts: serialized voice and audio config, so any change to the
+    # voice or output format is a different entry.
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8"))
+    for part in request_parts:
+        digest.update(b"\0")
+        digest.update(part)
+    return digest.hexdigest()
+
+
+DISK_LOW_WATERMARK = 0.9  # evict files down to this share of max_disk_bytes
+
+
+class TTSCache:
+    # In-memory LRU capped at max_bytes of audio, with an optional directory
+    # tier that survives restarts, capped at max_disk_bytes. Reading a file
+    # refreshes its mtime, so the directory is evicted least recently read first.
+    # Safe to share between executor threads.
+
+    def __init__(
+        self,
+        max_bytes=64 * 1024 * 1024,
+        directory=None,
+        max_disk_bytes=512 * 1024 * 1024,
+    ):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.disk_size = 0
+        self.lock = threading.Lock()
+        self.disk_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.disk_size = sum(size for _, _, size in self._disk_entries())
+
+    def get(self, key, memory_only=False):
+        with self.lock:
+            audio = self.entries.get(key)
+            if audio is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return audio
+        if not memory_only:
+            audio = self._read_file(key)
+            if audio is not None:
+                self._remember(key, audio)
+                with self.lock:
+                    self.hits += 1
+                return audio
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, audio):
+        self._remember(key, audio)
+        self._write_file(key, audio)
+
+    def _remember(self, key, audio):
+        if len(audio) > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[key] = audio
+            self.size += len(audio)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.audio")
+
+    def _read_file(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as cached:
+                audio = cached.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            logger.warning("Could not read TTS cache entry %s", key, exc_info=True)
+            return None
+        return audio
+
+    def _write_file(self, key, audio):
+        if not self.directory or len(audio) > self.max_disk_bytes:
+            return
+        path = self._path(key)
+        try:
+            previous = os.path.getsize(path)
+        except OSError:
+            previous = 0
+        try:
+            # Write then rename so a crash never leaves a truncated entry.
+            handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(handle, "wb") as cached:
+                cached.write(audio)
+            os.replace(temporary, path)
+        except OSError:
+            logger.warning("Could not write TTS cache entry %s", key, exc_info=True)
+            return
+        with self.disk_lock:
+            self.disk_size += len(audio) - previous
+            if self.disk_size > self.max_disk_bytes:
+                self._evict_files()
+
+    def _disk_entries(self):
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if not entry.name.endswith(".audio"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def _evict_files(self):
+        # The running total drifts with concurrent writers; rescanning here
+        # corrects it.
+        entries = sorted(self._disk_entries())
+        size = sum(file_size for _, _, file_size in entries)
+        target = self.max_disk_bytes * DISK_LOW_WATERMARK
+        evicted = 0
+        for _, path, file_size in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logger.warning("Could not evict TTS cache file %s", path, exc_info=True)
+                continue
+            size -= file_size
+            evicted += 1
+        self.disk_size = size
+        logger.debug("Evicted %d TTS cache files, %d bytes kept", evicted, size)
@@ -0,0 +1,90 @@
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+# Records are formatted and written by a background QueueListener thread, so
+# logging from the voice receive thread never blocks on stdout. The stock
+# QueueHandler.prepare() formats on the caller so records can be pickled; the
+# queue here is in-process, so DroppingQueueHandler skips that and hands the
+# record over as is. When the queue is full records are dropped and counted
+# instead of blocking the caller.
+
+LOG_FORMAT = "%(asctime)s %(levelname)-8s %(name)s: %(message)s"
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RateLimitFilter(logging.Filter):
+    # Lets through at most `burst` records per call site every `interval`
+    # seconds and reports how many were suppressed on the next one let through.
+
+    def __init__(self, burst=20, interval=1.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.windows = dict()
+
+    def filter(self, record):
+        key = (record.name, record.lineno)
+        now = time.monotonic()
+        with self.lock:
+            started, count, suppressed = self.windows.get(key, (now, 0, 0))
+            if now - started >= self.interval:
+                started, count = now, 0
+            if count >= self.burst:
+                self.windows[key] = (started, count, suppressed + 1)
+                return False
+            self.windows[key] = (started, count + 1, 0)
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
+
+
+class Sampler:
+    # Hot-path sampling: should_log(key) is true for one call in every `every`
+    # per key. Keep the isEnabledFor check in front of it so disabled levels
+    # cost nothing.
+
+    def __init__(self, every=None):
+        self.every = max(1, every or int(os.getenv("LOG_SAMPLE_EVERY", "250")))
+        self.counts = dict()
+
+    def should_log(self, key=None):
+        count = self.counts.get(key, 0)
+        self.counts[key] = count + 1
+        return count % self.every == 0
+
+
+def setup_logging(level=None, stream=None, queue_size=10000, burst=20, interval=1.0):
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(burst, interval))
+
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = logging.handlers.QueueListener(log_queue, writer)
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+    listener.start()
+    return listener
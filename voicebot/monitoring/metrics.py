@@ -0,0 +1,241 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Minimal Prometheus text-format metrics. aiohttp already ships with discord.py,
+# so the endpoint needs no extra dependency.
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    kind = None
+    suffix = ""  # appended to the name in the exposition
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.children = dict()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *labelvalues, **labelkwargs):
+        if labelkwargs:
+            labelvalues = tuple(labelkwargs[name] for name in self.labelnames)
+        labelvalues = tuple(str(value) for value in labelvalues)
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        with self.lock:
+            if labelvalues not in self.children:
+                self.children[labelvalues] = self.new_child()
+            return self.children[labelvalues]
+
+    def remove(self, *labelvalues):
+        with self.lock:
+            self.children.pop(tuple(str(value) for value in labelvalues), None)
+
+    def collect(self):
+        lines = [
+            f"# HELP {self.name}{self.suffix} {self.documentation}",
+            f"# TYPE {self.name}{self.suffix} {self.kind}",
+        ]
+        with self.lock:
+            children = list(self.children.items())
+        for labelvalues, child in children:
+            lines.extend(self.collect_child(labelvalues, child))
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.0
+        self.function = None
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value):
+        with self.lock:
+            self.value = value
+
+    def set_function(self, function):
+        self.function = function
+
+    def get(self):
+        if self.function is not None:
+            return self.function()
+        return self.value
+
+
+class Counter(Metric):
+    kind = "counter"
+    suffix = "_total"
+
+    def new_child(self):
+        return _Value()
+
+    def collect_child(self, labelvalues, child):
+        labels = _format_labels(self.labelnames, labelvalues)
+        return [f"{self.name}{self.suffix}{labels} {_format_value(child.get())}"]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def new_child(self):
+        return _Value()
+
+    def collect_child(self, labelvalues, child):
+        labels = _format_labels(self.labelnames, labelvalues)
+        return [f"{self.name}{labels} {_format_value(child.get())}"]
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        with self.lock:
+            self.sum += value
+            self.count += 1
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[index] += 1
+                    break
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def collect_child(self, labelvalues, child):
+        with child.lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(
+                self.labelnames, labelvalues, [("le", _format_value(bound))]
+            )
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, labelvalues)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def exposition(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_LATENCY = Histogram(
+    "voicebot_stage_latency_seconds",
+    "Latency of a conversation stage (stt, llm, tts, playback, queue_wait, turn).",
+    ["stage", "guild"],
+)
+STAGE_REQUESTS = Counter(
+    "voicebot_stage_requests",
+    "Completed stage calls by outcome (ok, error, or cached for TTS cache hits).",
+    ["stage", "guild", "outcome"],
+)
+STAGE_IN_FLIGHT = Gauge(
+    "voicebot_stage_in_flight",
+    "Stage calls currently in progress.",
+    ["stage"],
+)
+QUEUE_DEPTH = Gauge(
+    "voicebot_queue_depth",
+    "Items waiting in a pipeline queue.",
+    ["queue", "guild"],
+)
+WAKE_WORD_CHECKS = Counter(
+    "voicebot_wake_word_checks",
+    "Utterances screened by the local wake-word spotter (passed or rejected).",
+    ["guild", "outcome"],
+)
+
+
+@contextmanager
+def track(stage, guild="none"):
+    in_flight = STAGE_IN_FLIGHT.labels(stage)
+    in_flight.inc()
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        in_flight.dec()
+        STAGE_LATENCY.labels(stage, guild).observe(time.perf_counter() - started)
+        STAGE_REQUESTS.labels(stage, guild, outcome).inc()
+
+
+def observe(stage, seconds, guild="none"):
+    STAGE_LATENCY.labels(stage, guild).observe(seconds)
+
+
+async def start_metrics_server(port, host="127.0.0.1", registry=REGISTRY):
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(
+            text=registry.exposition(),
+            content_type="text/plain",
+            charset="utf-8",
+            headers={"X-Content-Type-Options": "nosniff"},
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_OVERHEAD = 4  # role and separators the chat format adds per message
+
+SUMMARY_PROMPT = "Streszczasz rozmowę głosową asystenta Alvin z użytkownikiem. Zaktualizuj streszczenie o nowe wiadomości. Zachowaj fakty, imiona, ustalenia i otwarte pytania. Pisz zwięźle, maksymalnie 120 słów, bez wstępów."
+
+
+class TokenCounter:
+    # Exact counts with tiktoken when it is installed, otherwise an estimate;
+    # Polish text averages about three characters per token.
+
+    def __init__(self, model="gpt-3.5-turbo"):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except Exception:
+                logger.warning("No tiktoken encoding for %s, estimating tokens", model)
+
+    def count(self, text):
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return len(text) // 3 + 1
+
+    def count_message(self, message):
+        return self.count(message["content"]) + MESSAGE_OVERHEAD
+
+
+class ChatHistory:
+    # System prompt + running summary + the newest turns that fit in
+    # window_tokens. Once the turns outgrow the window, the oldest ones are
+    # folded into the summary by a background task, keeping compact_to_tokens
+    # of recent turns verbatim. Requests never wait for the summary: until it
+    # lands, turns outside the window are simply left out.
+
+    def __init__(
+        self,
+        system_prompt,
+        summarizer=None,
+        window_tokens=1000,
+        compact_to_tokens=500,
+        counter=None,
+    ):
+        self.system_prompt = system_prompt
+        self.summarizer = summarizer
+        self.window_tokens = window_tokens
+        self.compact_to_tokens = compact_to_tokens
+        self.counter = counter or TokenCounter()
+        self.summary = ""
+        self.turns = []
+        self.compaction = None
+
+    def __bool__(self):
+        return bool(self.turns) or bool(self.summary)
+
+    @property
+    def turn_tokens(self):
+        return sum(tokens for _, tokens in self.turns)
+
+    def add(self, role, content):
+        message = {"role": role, "content": content}
+        self.turns.append((message, self.counter.count_message(message)))
+        if self.turn_tokens > self.window_tokens:
+            self._schedule_compaction()
+
+    def messages(self):
+        system = self.system_prompt
+        if self.summary:
+            system = f"{system}\n\nStreszczenie wcześniejszej rozmowy: {self.summary}"
+        recent = self._recent(self.window_tokens)
+        return [{"role": "system", "content": system}] + [
+            message for message, _ in self.turns[len(self.turns) - recent :]
+        ]
+
+    def clear(self):
+        if self.compaction is not None:
+            self.compaction.cancel()
+            self.compaction = None
+        self.summary = ""
+        self.turns = []
+
+    def _recent(self, budget):
+        # Number of newest turns that fit in budget; the last one always does.
+        used = 0
+        count = 0
+        for _, tokens in reversed(self.turns):
+            if count and used + tokens > budget:
+                break
+            used += tokens
+            count += 1
+        return count
+
+    def _schedule_compaction(self):
+        if self.summarizer is None or self.compaction is not None:
+            return
+        folded = len(self.turns) - self._recent(self.compact_to_tokens)
+        if folded <= 0:
+            return
+        self.compaction = asyncio.create_task(self._compact(self.turns, folded))
+
+    async def _compact(self, turns, folded):
+        transcript = "\n".join(
+            f"{'Alvin' if message['role'] == 'assistant' else 'Użytkownik'}: {message['content']}"
+            for message, _ in turns[:folded]
+        )
+        prompt = [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {
+                "role": "user",
+                "content": f"Dotychczasowe streszczenie: {self.summary or 'brak'}\n\nNowe wiadomości:\n{transcript}",
+            },
+        ]
+        try:
+            summary = await self.summarizer(prompt)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Chat history summarization failed")
+            self.compaction = None
+            return
+        self.compaction = None
+        if turns is not self.turns or not summary:
+            return
+        # Turns are only ever appended, so the folded ones are still in front.
+        self.summary = summary.strip()
+        del self.turns[:folded]
+        logger.debug(
+            "Folded %d turns into the summary, %d tokens of turns kept",
+            folded,
+            self.turn_tokens,
+        )
+        if self.turn_tokens > self.window_tokens:
+            self._schedule_compaction()
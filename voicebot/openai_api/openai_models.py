@@ -1,7 +1,10 @@
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import openai
+import asyncio
+import httpx
 import os
+import re
 
 load_dotenv()
 
@@ -9,6 +12,46 @@ api_key = os.getenv("OPENAI_API_KEY")
 client = OpenAI(api_key=api_key)
 
 
+class AsyncOpenAIProvider:
+    # The client and semaphore are created lazily so they bind to the bot's loop.
+
+    def __init__(
+        self, max_concurrency=8, timeout=30.0, connect_timeout=5.0, max_connections=20
+    ):
+        self.max_concurrency = max_concurrency
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        )
+        self._client = None
+        self._semaphore = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = AsyncOpenAI(
+                api_key=api_key,
+                timeout=self.timeout,
+                http_client=httpx.AsyncClient(limits=self.limits, timeout=self.timeout),
+            )
+        return self._client
+
+    @property
+    def semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+async_openai_provider = AsyncOpenAIProvider()
+
+
 def openai_gpt(messages):
 
     response = client.chat.completions.create(
@@ -26,14 +69,99 @@ def openai_gpt(messages):
     return message
 
 
-def openai_tts(messages):
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+
+def _cut_sentences(pending, min_length):
+
+    sentences = []
+    while True:
+        boundary = next(
+            (
+                match
+                for match in SENTENCE_END.finditer(pending)
+                if match.start() >= min_length
+            ),
+            None,
+        )
+        if boundary is None:
+            return sentences, pending
+        sentence = pending[: boundary.start()].strip()
+        pending = pending[boundary.end() :]
+        if sentence:
+            sentences.append(sentence)
+
+
+async def openai_gpt_async(messages, timeout=None):
+
+    async with async_openai_provider.semaphore:
+        response = await async_openai_provider.client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=messages,
+            max_tokens=200,
+            n=1,
+            stop=None,
+            temperature=0.7,
+            timeout=timeout or async_openai_provider.timeout,
+        )
+
+    return response.choices[0].message.content
+
+
+async def openai_gpt_stream_async(messages, timeout=None):
+
+    async with async_openai_provider.semaphore:
+        stream = await async_openai_provider.client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=messages,
+            max_tokens=200,
+            n=1,
+            stop=None,
+            temperature=0.7,
+            stream=True,
+            timeout=timeout or async_openai_provider.timeout,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+async def aiter_sentences(tokens, min_length=12):
+
+    pending = ""
+    async for token in tokens:
+        pending += token
+        sentences, pending = _cut_sentences(pending, min_length)
+        for sentence in sentences:
+            yield sentence
+
+    if pending.strip():
+        yield pending.strip()
+
+
+def openai_tts(messages, response_format="mp3"):
+    # response_format="opus" returns Ogg Opus that plays without decoding.
 
     response = openai.audio.speech.create(
         model="tts-1",
         voice="shimmer",
         input=messages,
+        response_format=response_format,
     )
 
     audio_data = response.content
 
     return audio_data
+
+
+
+def openai_tts_stream(messages, chunk_size=4800):
+    # Raw 24 kHz mono 16-bit PCM, yielded as the chunked response arrives.
+
+    with openai.audio.speech.with_streaming_response.create(
+        model="tts-1",
+        voice="shimmer",
+        input=messages,
+        response_format="pcm",
+    ) as response:
+        yield from response.iter_bytes(chunk_size)
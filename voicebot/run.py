@@ -1,4 +1,9 @@
+from monitoring.logs import setup_logging
 from voicebot_api.voicebot import bot, discord_token
 
 if __name__ == "__main__":
-    bot.run(discord_token)
+    log_listener = setup_logging()
+    try:
+        bot.run(discord_token, log_handler=None)
+    finally:
+        log_listener.stop()
\ No newline at end of file
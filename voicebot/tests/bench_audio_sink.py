@@ -0,0 +1,273 @@
+import argparse
+import contextlib
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from discord_vc_tools.audio_api import BufferAudioSink
+from discord_vc_tools.audio_sources import read_wav
+
+# Replays voice packets through BufferAudioSink.write the way voice_recv does:
+# one 20 ms stereo frame per speaker every packet interval.
+# Run from the voicebot directory: python -m tests.bench_audio_sink --speakers 10
+
+SAMPLE_RATE = 48000
+FRAME_SAMPLES = 960
+CHANNELS = 2
+PACKET_MS = 20
+
+
+class FakeUser:
+    def __init__(self, id):
+        self.id = id
+
+
+class FakeVoiceData:
+    # Like voice_recv's VoiceData: pcm is b"" when the sink asked for Opus.
+    def __init__(self, pcm, opus=None):
+        self.pcm = pcm if pcm else b""
+        self.opus = opus
+        self.packet = None
+
+
+def generate_speech(seconds, seed, word_pause_ms=0):
+    # Syllable-modulated harmonic bursts separated by low-level noise. With
+    # word_pause_ms each burst is a phrase of words with short pauses between
+    # them, which should still flush as one utterance.
+    # Returns the packets and the index of the last speech packet of each burst.
+    rng = np.random.default_rng(seed)
+    total = int(seconds * 1000 / PACKET_MS)
+    signal = rng.normal(0, 4, total * FRAME_SAMPLES)
+    speech_ends = []
+    position = int(rng.uniform(0.2, 1.0) * 1000 / PACKET_MS)
+    while position < total:
+        length = int(rng.uniform(0.8, 3.0) * 1000 / PACKET_MS)
+        end = min(position + length, total)
+        for word_start, word_end in phrase_words(rng, position, end, word_pause_ms):
+            signal[word_start * FRAME_SAMPLES : word_end * FRAME_SAMPLES] += (
+                speech_burst(rng, word_end - word_start)
+            )
+        speech_ends.append(end - 1)
+        position = end + int(rng.uniform(0.3, 1.2) * 1000 / PACKET_MS)
+    return to_packets(signal), speech_ends
+
+
+def phrase_words(rng, start, end, word_pause_ms):
+    if not word_pause_ms:
+        return [(start, end)]
+    pause = max(int(word_pause_ms / PACKET_MS), 1)
+    words = []
+    while start < end:
+        word_end = min(start + int(rng.uniform(0.25, 0.6) * 1000 / PACKET_MS), end)
+        if end - word_end <= pause:
+            word_end = end
+        words.append((start, word_end))
+        start = word_end + pause
+    return words
+
+
+def generate_utterance(seconds, seed, trailing_frames=5):
+    # One burst followed by the few silence frames a Discord client sends
+    # before it stops transmitting. Returns the packets and the last speech index.
+    rng = np.random.default_rng(seed)
+    frames = int(seconds * 1000 / PACKET_MS)
+    signal = rng.normal(0, 4, (frames + trailing_frames) * FRAME_SAMPLES)
+    signal[: frames * FRAME_SAMPLES] += speech_burst(rng, frames)
+    return to_packets(signal), frames - 1
+
+
+def speech_burst(rng, frames):
+    t = np.arange(frames * FRAME_SAMPLES) / SAMPLE_RATE
+    pitch = rng.uniform(90, 220)
+    voiced = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * rng.uniform(3, 6) * t)
+    return 4000 * voiced * envelope
+
+
+def load_wav(path):
+    with open(path, "rb") as wav_file:
+        samples, sample_rate, channels = read_wav(wav_file.read())
+    if sample_rate != SAMPLE_RATE:
+        raise ValueError(f"Expected {SAMPLE_RATE} Hz audio, got {sample_rate} Hz")
+    if channels == CHANNELS:
+        samples = samples.reshape(-1, CHANNELS).mean(axis=1)
+    return to_packets(samples), None
+
+
+def to_packets(mono):
+    mono = np.clip(mono, -32768, 32767).astype(np.int16)
+    mono = mono[: len(mono) // FRAME_SAMPLES * FRAME_SAMPLES]
+    stereo = np.repeat(mono, CHANNELS)
+    frame_bytes = FRAME_SAMPLES * CHANNELS * 2
+    pcm = stereo.tobytes()
+    return [pcm[i : i + frame_bytes] for i in range(0, len(pcm), frame_bytes)]
+
+
+def encode_packets(packets):
+    import discord
+
+    encoder = discord.opus.Encoder()
+    return [encoder.encode(pcm, encoder.SAMPLES_PER_FRAME) for pcm in packets]
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) else float("nan")
+
+
+def run(
+    speakers,
+    seconds,
+    realtime=False,
+    wav=None,
+    trace_malloc=False,
+    opus=False,
+    caller=False,
+    word_pause_ms=0,
+):
+    streams = []
+    for speaker in range(speakers):
+        if wav:
+            packets, speech_ends = load_wav(wav)
+        else:
+            packets, speech_ends = generate_speech(
+                seconds, seed=speaker, word_pause_ms=word_pause_ms
+            )
+        if opus:
+            packets = encode_packets(packets)
+        streams.append((FakeUser(speaker + 1), packets, speech_ends))
+    packet_count = min(len(packets) for _, packets, _ in streams)
+
+    flushes = []
+    current_index = [0]
+
+    def on_flush(speaker, pcm_s16le):
+        if pcm_s16le:
+            flushes.append((speaker, current_index[0], time.perf_counter()))
+
+    sink = BufferAudioSink(on_flush, lazy_decode=opus)
+    if caller:
+        sink.caller_id = streams[0][0].id
+    cpu_times = np.empty(packet_count * speakers, dtype=np.int64)
+    sample = 0
+    if trace_malloc:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+    blocks_before = sys.getallocatedblocks()
+
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for index in range(packet_count):
+            current_index[0] = index
+            for user, packets, _ in streams:
+                if opus:
+                    data = FakeVoiceData(b"", packets[index])
+                else:
+                    data = FakeVoiceData(packets[index])
+                cpu_start = time.thread_time_ns()
+                sink.write(user, data)
+                cpu_times[sample] = time.thread_time_ns() - cpu_start
+                sample += 1
+            if realtime:
+                delay = started + (index + 1) * PACKET_MS / 1000 - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+    elapsed = time.perf_counter() - started
+
+    blocks_after = sys.getallocatedblocks()
+    if trace_malloc:
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        block_diff = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+
+    latencies = []
+    missed = 0
+    phrases = 0
+    split_flushes = 0
+    for user, _, speech_ends in streams:
+        if speech_ends is None:
+            continue
+        speaker_flushes = [index for speaker, index, _ in flushes if speaker == user.id]
+        previous_flush = -1
+        for end in speech_ends:
+            if end >= packet_count:
+                continue
+            phrases += 1
+            # Flushes before the phrase ended cut it into pieces.
+            split_flushes += sum(
+                1 for index in speaker_flushes if previous_flush < index < end
+            )
+            detected = next((index for index in speaker_flushes if index >= end), None)
+            if detected is None:
+                missed += 1
+            else:
+                latencies.append((detected - end) * PACKET_MS)
+                previous_flush = detected
+
+    cpu_us = cpu_times / 1000
+    total_packets = packet_count * speakers
+    print(f"speakers: {speakers}, packets: {total_packets}, wall: {elapsed:.2f} s")
+    print(
+        "cpu per packet (us): "
+        f"mean {cpu_us.mean():.1f}, p50 {percentile(cpu_us, 50):.1f}, "
+        f"p99 {percentile(cpu_us, 99):.1f}, max {cpu_us.max():.1f}"
+    )
+    print(
+        f"allocated blocks (net): {blocks_after - blocks_before}, "
+        f"per packet: {(blocks_after - blocks_before) / total_packets:.3f}"
+    )
+    if trace_malloc:
+        print(f"traced blocks (net): {block_diff}, traced peak: {peak / 1024:.0f} KiB")
+    minutes = packet_count * PACKET_MS / 60000
+    print(
+        f"flushes: {len(flushes)}, "
+        f"per speaker-minute: {len(flushes) / speakers / minutes:.1f}"
+    )
+    if opus:
+        print(
+            f"opus packets decoded: {sink.decoded_packets}, "
+            f"skipped as silence: {sink.skipped_packets}"
+        )
+    if phrases:
+        print(f"phrases: {phrases}, flushed mid-phrase: {split_flushes}")
+    if latencies or missed:
+        print(
+            "end-of-speech latency (ms): "
+            f"p50 {percentile(latencies, 50):.0f}, p90 {percentile(latencies, 90):.0f}, "
+            f"p99 {percentile(latencies, 99):.0f}, undetected: {missed}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--speakers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--wav", help="48 kHz WAV file replayed for every speaker")
+    parser.add_argument("--realtime", action="store_true", help="pace packets at 50/s")
+    parser.add_argument("--trace-malloc", action="store_true")
+    parser.add_argument(
+        "--opus", action="store_true", help="feed raw Opus packets to a lazy-decoding sink"
+    )
+    parser.add_argument(
+        "--caller", action="store_true", help="set the first speaker as the caller"
+    )
+    parser.add_argument(
+        "--word-pause-ms",
+        type=float,
+        default=0,
+        help="split each phrase into words separated by pauses of this length",
+    )
+    args = parser.parse_args()
+    run(
+        args.speakers,
+        args.seconds,
+        args.realtime,
+        args.wav,
+        args.trace_malloc,
+        args.opus,
+        args.caller,
+        args.word_pause_ms,
+    )
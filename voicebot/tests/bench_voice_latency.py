@@ -0,0 +1,212 @@
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from discord_vc_tools.audio_api import AudioListener
+from gcloud_api.tts_cache import TTSCache
+from tests.bench_audio_sink import FakeUser, FakeVoiceData, PACKET_MS, generate_utterance
+from tests.fake_providers import (
+    FakeLanguageModel,
+    FakeStreamingSynthesizer,
+    FakeTranscriber,
+    FakeVoiceClient,
+    LatencyModel,
+)
+
+# Mouth-to-ear latency of AudioListener with local stand-in providers.
+# Every turn paces one utterance through the sink at 50 packets/s and waits for
+# the reply to finish playing. Times are measured from the last speech packet.
+# Run from the voicebot directory: python -m tests.bench_voice_latency --turns 20
+# With --max-p50/--max-p99 it is a regression gate: it exits with status 1 when
+# the gated stage is slower than the limit or any turn times out.
+
+STAGES = [
+    ("transcript", "time to transcript"),
+    ("first_token", "time to first token"),
+    ("first_audio_frame", "time to first audio frame"),
+    ("turn_done", "total turn time"),
+]
+
+
+class Turn:
+    def __init__(self, loop, expected_plays):
+        self.loop = loop
+        self.expected_plays = expected_plays
+        self.plays = 0
+        self.events = dict()
+        self.done = asyncio.Event()
+
+
+class TurnRecorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = None
+        self.turns = []
+
+    def start_turn(self, loop, expected_plays):
+        with self.lock:
+            self.current = Turn(loop, expected_plays)
+            self.turns.append(self.current)
+            return self.current
+
+    def mark(self, event):
+        now = time.perf_counter()
+        with self.lock:
+            turn = self.current
+            if turn is None:
+                return
+            turn.events.setdefault(event, now)
+            if event == "playback_finished":
+                turn.plays += 1
+                if turn.plays == turn.expected_plays:
+                    turn.events["turn_done"] = now
+                    turn.loop.call_soon_threadsafe(turn.done.set)
+
+
+def feed(sink, user, packets, speech_end, turn):
+    started = time.perf_counter()
+    for index, pcm in enumerate(packets):
+        sink.write(user, FakeVoiceData(pcm))
+        if index == speech_end:
+            turn.events["speech_end"] = time.perf_counter()
+        delay = started + (index + 1) * PACKET_MS / 1000 - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+async def run(args):
+    recorder = TurnRecorder()
+    language_model = FakeLanguageModel(
+        LatencyModel(args.llm_first_token_ms, args.spread, seed=2),
+        LatencyModel(args.token_ms, args.spread, seed=3),
+        sentences=args.sentences,
+        recorder=recorder,
+    )
+
+    listener = AudioListener(
+        streaming_llm=args.streaming_llm, streaming_tts=args.streaming_tts
+    )
+    listener.transcriber = FakeTranscriber(
+        LatencyModel(args.stt_ms, args.spread, seed=1), recorder=recorder
+    )
+    listener.language_model = language_model
+    listener.stream_language_model = language_model.stream
+    synthesizer = FakeStreamingSynthesizer(
+        LatencyModel(args.tts_ms, args.spread, seed=4), recorder=recorder
+    )
+    listener.synthesizer = synthesizer
+    listener.stream_synthesizer = synthesizer.stream
+    listener.cached_synthesizer = None
+    listener.opus_cache = TTSCache()
+    listener.voice_channel = "bench"
+    listener.voice_client = FakeVoiceClient(recorder, realtime=not args.fast_playback)
+    listener.start_transcription()
+    pipeline = asyncio.create_task(listener.message_sending_loop(None))
+
+    loop = asyncio.get_running_loop()
+    user = FakeUser(1)
+    expected_plays = language_model.sentences if args.streaming_llm else 1
+    timeouts = 0
+    for index in range(args.turns):
+        packets, speech_end = generate_utterance(
+            args.utterance_seconds, seed=index, trailing_frames=args.trailing_frames
+        )
+        turn = recorder.start_turn(loop, expected_plays)
+        await loop.run_in_executor(
+            None, feed, listener.audio_sink, user, packets, speech_end, turn
+        )
+        try:
+            await asyncio.wait_for(turn.done.wait(), timeout=args.turn_timeout)
+        except asyncio.TimeoutError:
+            timeouts += 1
+
+    await listener.stop_listening()
+    pipeline.cancel()
+    await asyncio.gather(pipeline, return_exceptions=True)
+    return recorder.turns, timeouts
+
+
+def report(turns, timeouts, args):
+    mode = "streaming" if args.streaming_llm else "one-shot"
+    tts_mode = "streaming" if args.streaming_tts else "one-shot"
+    print(
+        f"turns: {len(turns)}, llm mode: {mode}, tts mode: {tts_mode}, "
+        f"timed out: {timeouts}"
+    )
+    percentiles = dict()
+    for event, label in STAGES:
+        values = [
+            (turn.events[event] - turn.events["speech_end"]) * 1000
+            for turn in turns
+            if event in turn.events and "speech_end" in turn.events
+        ]
+        if not values:
+            print(f"{label:>26}: no samples")
+            continue
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        percentiles[event] = (p50, p99)
+        print(
+            f"{label:>26}: p50 {p50:7.0f} ms, p90 {p90:7.0f} ms, "
+            f"p99 {p99:7.0f} ms, n={len(values)}"
+        )
+    return percentiles
+
+
+def gate_failures(percentiles, timeouts, args):
+    failures = []
+    if timeouts:
+        failures.append(f"{timeouts} turns timed out")
+    label = dict(STAGES)[args.gate_stage]
+    p50, p99 = percentiles.get(args.gate_stage, (np.nan, np.nan))
+    for name, value, limit in (("p50", p50, args.max_p50), ("p99", p99, args.max_p99)):
+        # A stage without samples (nan) fails too.
+        if limit is not None and not value <= limit:
+            failures.append(f"{label} {name} {value:.0f} ms exceeds {limit:.0f} ms")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--utterance-seconds", type=float, default=1.5)
+    parser.add_argument("--stt-ms", type=float, default=300)
+    parser.add_argument("--llm-first-token-ms", type=float, default=400)
+    parser.add_argument("--token-ms", type=float, default=25)
+    parser.add_argument("--tts-ms", type=float, default=200)
+    parser.add_argument(
+        "--trailing-frames",
+        type=int,
+        default=5,
+        help="silence packets sent after speech (0: ended by the inactivity timer)",
+    )
+    parser.add_argument("--spread", type=float, default=0.3, help="log-normal sigma")
+    parser.add_argument("--sentences", type=int, default=3)
+    parser.add_argument("--streaming-llm", action="store_true")
+    parser.add_argument("--streaming-tts", action="store_true")
+    parser.add_argument("--fast-playback", action="store_true", help="do not pace playback")
+    parser.add_argument("--turn-timeout", type=float, default=30.0)
+    parser.add_argument("--max-p50", type=float, help="gate: p50 limit in ms")
+    parser.add_argument("--max-p99", type=float, help="gate: p99 limit in ms")
+    parser.add_argument(
+        "--gate-stage",
+        choices=[event for event, _ in STAGES],
+        default="first_audio_frame",
+        help="stage the --max-p50/--max-p99 limits apply to",
+    )
+    args = parser.parse_args()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        turns, timeouts = asyncio.run(run(args))
+    percentiles = report(turns, timeouts, args)
+    if args.max_p50 is not None or args.max_p99 is not None:
+        failures = gate_failures(percentiles, timeouts, args)
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        if failures:
+            sys.exit(1)
+        print("latency gate passed")
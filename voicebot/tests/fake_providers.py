@@ -0,0 +1,169 @@
+import asyncio
+import io
+import threading
+import time
+import wave
+
+import numpy as np
+
+# Local stand-ins for the transcriber, language_model, stream_language_model
+# and synthesizer that AudioListener calls, plus a voice client that "plays"
+# audio sources on a player thread like discord.py does. Every stage sleeps
+# for a sample from a LatencyModel and reports timestamps to a recorder.
+
+
+class LatencyModel:
+    # Log-normal latency around a median, in milliseconds.
+
+    def __init__(self, median_ms, spread=0.3, seed=None):
+        self.median_ms = median_ms
+        self.spread = spread
+        self.rng = np.random.default_rng(seed)
+
+    def sample(self):
+        if self.median_ms <= 0:
+            return 0.0
+        return self.median_ms * float(np.exp(self.rng.normal(0, self.spread))) / 1000
+
+
+class NullRecorder:
+    def mark(self, event):
+        pass
+
+
+class FakeTranscriber:
+    def __init__(self, latency, transcript="Alvin, jak się dzisiaj masz?", recorder=None):
+        self.latency = latency
+        self.transcript = transcript
+        self.recorder = recorder or NullRecorder()
+        self.calls = 0
+
+    def __call__(self, pcm_s16le):
+        time.sleep(self.latency.sample())
+        self.calls += 1
+        self.recorder.mark("transcript")
+        return self.transcript
+
+
+class FakeLanguageModel:
+    def __init__(
+        self,
+        first_token_latency,
+        token_latency,
+        sentences=3,
+        words_per_sentence=8,
+        recorder=None,
+    ):
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.recorder = recorder or NullRecorder()
+        sentence = " ".join(["słowo"] * words_per_sentence) + "."
+        self.reply = " ".join([sentence] * sentences)
+        self.tokens = [word + " " for word in self.reply.split(" ")]
+        self.sentences = sentences
+
+    async def __call__(self, messages):
+        await asyncio.sleep(self.first_token_latency.sample())
+        self.recorder.mark("first_token")
+        for _ in self.tokens[1:]:
+            await asyncio.sleep(self.token_latency.sample())
+        return self.reply
+
+    async def stream(self, messages):
+        await asyncio.sleep(self.first_token_latency.sample())
+        self.recorder.mark("first_token")
+        yield self.tokens[0]
+        for token in self.tokens[1:]:
+            await asyncio.sleep(self.token_latency.sample())
+            yield token
+
+
+class FakeSynthesizer:
+    def __init__(self, latency, seconds_per_char=0.06, recorder=None):
+        self.latency = latency
+        self.seconds_per_char = seconds_per_char
+        self.recorder = recorder or NullRecorder()
+
+    def __call__(self, text):
+        time.sleep(self.latency.sample())
+        self.recorder.mark("audio_ready")
+        samples = np.zeros(int(len(text) * self.seconds_per_char * 48000), dtype=np.int16)
+        audio = io.BytesIO()
+        with wave.open(audio, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(48000)
+            wav.writeframes(samples.tobytes())
+        return audio.getvalue()
+
+
+class FakeStreamingSynthesizer(FakeSynthesizer):
+    # Yields 24 kHz mono PCM in chunk_seconds pieces: the first after
+    # first_chunk_share of the sampled latency, the rest spread over the remainder.
+
+    def __init__(
+        self,
+        latency,
+        seconds_per_char=0.06,
+        chunk_seconds=0.1,
+        first_chunk_share=0.3,
+        recorder=None,
+    ):
+        super().__init__(latency, seconds_per_char, recorder)
+        self.chunk_seconds = chunk_seconds
+        self.first_chunk_share = first_chunk_share
+
+    def stream(self, text):
+        total = self.latency.sample()
+        chunks = max(1, int(len(text) * self.seconds_per_char / self.chunk_seconds))
+        chunk = bytes(int(24000 * self.chunk_seconds) * 2)
+        time.sleep(total * self.first_chunk_share)
+        self.recorder.mark("audio_ready")
+        for index in range(chunks):
+            if index:
+                time.sleep(total * (1 - self.first_chunk_share) / chunks)
+            yield chunk
+
+
+class FakeVoiceClient:
+    def __init__(self, recorder=None, realtime=True):
+        self.recorder = recorder or NullRecorder()
+        self.realtime = realtime
+        self.playing = False
+        self.stopped = threading.Event()
+
+    def play(self, source, after=None):
+        self.playing = True
+        self.stopped.clear()
+        threading.Thread(target=self._play, args=(source, after), daemon=True).start()
+
+    def _play(self, source, after):
+        started = time.perf_counter()
+        frames = 0
+        while not self.stopped.is_set():
+            data = source.read()
+            if not data:
+                break
+            if frames == 0:
+                self.recorder.mark("first_audio_frame")
+            frames += 1
+            if self.realtime:
+                delay = started + frames * 0.02 - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        self.playing = False
+        self.recorder.mark("playback_finished")
+        if after is not None:
+            after(None)
+
+    def is_playing(self):
+        return self.playing
+
+    def stop(self):
+        self.stopped.set()
+
+    def stop_listening(self):
+        pass
+
+    async def disconnect(self):
+        self.stop()
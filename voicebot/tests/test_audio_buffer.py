@@ -0,0 +1,154 @@
+import numpy as np
+
+from discord_vc_tools.audio_api import AudioBuffer, BufferAudioSink
+from discord_vc_tools.opus_packets import OPUS_SILENCE
+
+
+class FakeUser:
+    def __init__(self, id):
+        self.id = id
+
+
+class FakePacket:
+    def __init__(self, ssrc):
+        self.ssrc = ssrc
+
+
+class FakeVoiceData:
+    # Like voice_recv's VoiceData: pcm is b"" when the sink asked for Opus.
+    def __init__(self, pcm=b"", opus=None, packet=None):
+        self.pcm = pcm if pcm else b""
+        self.opus = opus
+        self.packet = packet
+
+
+class FakeDecoder:
+    def __init__(self, pcm):
+        self.pcm = pcm
+        self.calls = 0
+
+    def decode(self, packet, fec=False):
+        self.calls += 1
+        return self.pcm
+
+
+def voiced_frame(sink, index):
+    # Low-pitched tone, loud enough for the VAD; the amplitude tags the frame.
+    t = np.arange(sink.NUM_SAMPLES) / 48000
+    mono = ((2000 + index) * np.sin(2 * np.pi * 150 * t)).astype(np.int16)
+    return np.repeat(mono, sink.NUM_CHANNELS).tobytes()
+
+
+def make_sink(**options):
+    flushes = []
+    sink = BufferAudioSink(
+        lambda speaker, pcm: flushes.append((speaker, pcm)),
+        end_of_speech_gap=0,
+        **options,
+    )
+    return sink, flushes
+
+
+def test_mirrored_ring_reads_contiguously_across_the_wrap():
+    sink, _ = make_sink()
+    ring = AudioBuffer(1, sink)
+    count = sink.BUFFER_FRAME_COUNT
+    frames = [
+        np.full((sink.NUM_SAMPLES, sink.NUM_CHANNELS), index, dtype=np.int16)
+        for index in range(count + 100)
+    ]
+    for frame in frames[: count - 10]:
+        assert ring.fill_buffer(frame)
+    ring.clear_buffer(100 * sink.NUM_SAMPLES)
+    for frame in frames[count - 10 :]:
+        assert ring.fill_buffer(frame)
+
+    assert ring.is_full()
+    assert not ring.fill_buffer(frames[0])
+    span = ring.read_buffer()
+    assert span.base is ring.buffer
+    assert np.array_equal(span, np.concatenate(frames[100:]))
+
+
+def test_long_utterance_is_carried_over_in_order():
+    sink, flushes = make_sink()
+    user = FakeUser(1)
+    frames = [
+        voiced_frame(sink, index) for index in range(2 * sink.BUFFER_FRAME_COUNT + 37)
+    ]
+    for pcm in frames:
+        sink.write(user, FakeVoiceData(pcm))
+    assert flushes == []
+
+    silence = sink.SILENCE
+    hangover = sink.detectors[user.id].hangover_frames
+    for _ in range(hangover + 1):
+        sink.write(user, FakeVoiceData(silence))
+
+    assert len(flushes) == 1
+    speaker, pcm = flushes[0]
+    assert speaker == user.id
+    assert pcm == b"".join(frames) + silence * hangover
+    assert user.id not in sink.carry_over
+    assert sink.buffers[user.id].buffer_pointer == 0
+
+
+def test_rejected_burst_is_discarded():
+    sink, flushes = make_sink()
+    user = FakeUser(1)
+    for index in range(3):
+        sink.write(user, FakeVoiceData(voiced_frame(sink, index)))
+    for _ in range(sink.detectors[user.id].hangover_frames + 1):
+        sink.write(user, FakeVoiceData(sink.SILENCE))
+
+    assert flushes == [(user.id, None)]
+    assert sink.buffers[user.id].buffer_pointer == 0
+
+
+def test_lazy_decode_decodes_only_speech_packets():
+    sink, flushes = make_sink(lazy_decode=True)
+    user = FakeUser(1)
+    decoder = sink.decoders[user.id] = FakeDecoder(voiced_frame(sink, 0))
+    speech = bytes([0xFC]) + bytes(60)
+    for _ in range(20):
+        sink.write(user, FakeVoiceData(opus=speech))
+    hangover = sink.detectors[user.id].hangover_frames
+    for _ in range(hangover + 1):
+        sink.write(user, FakeVoiceData(opus=OPUS_SILENCE))
+
+    assert decoder.calls == sink.decoded_packets == 20
+    assert sink.skipped_packets == hangover + 1
+    assert flushes == [(user.id, decoder.pcm * 20 + sink.SILENCE * hangover)]
+
+
+def test_lazy_decode_skips_speakers_other_than_the_caller():
+    sink, flushes = make_sink(lazy_decode=True)
+    caller, other = FakeUser(1), FakeUser(2)
+    sink.caller_id = caller.id
+    decoder = sink.decoders[other.id] = FakeDecoder(voiced_frame(sink, 0))
+    for _ in range(20):
+        sink.write(other, FakeVoiceData(opus=bytes([0xFC]) + bytes(60)))
+
+    assert decoder.calls == 0
+    assert flushes == [(other.id, None)] * 20
+
+
+def test_disconnect_of_uncached_member_clears_state_by_ssrc():
+    sink, flushes = make_sink()
+    user = FakeUser(1)
+    for index in range(20):
+        sink.write(user, FakeVoiceData(voiced_frame(sink, index), packet=FakePacket(7)))
+
+    sink.on_voice_member_disconnect(None, 7)
+
+    assert len(flushes) == 1 and flushes[0][0] == user.id
+    assert user.id not in sink.buffers
+    assert user.id not in sink.detectors
+    assert sink.speakers_by_ssrc == {}
+
+
+def test_speaking_stop_ignores_unknown_member():
+    sink, flushes = make_sink()
+    sink.on_voice_member_speaking_stop(None)
+    sink.on_voice_member_disconnect(None, 7)
+    assert flushes == []
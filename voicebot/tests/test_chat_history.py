@@ -0,0 +1,125 @@
+import asyncio
+
+from openai_api.chat_history import ChatHistory
+
+
+class FixedCounter:
+    def count_message(self, message):
+        return 100
+
+
+class BlockingSummarizer:
+    def __init__(self, summary="streszczenie"):
+        self.summary = summary
+        self.release = asyncio.Event()
+        self.calls = 0
+
+    async def __call__(self, messages):
+        self.calls += 1
+        await self.release.wait()
+        return self.summary
+
+
+def make_history(summarizer):
+    return ChatHistory(
+        "system",
+        summarizer=summarizer,
+        window_tokens=300,
+        compact_to_tokens=200,
+        counter=FixedCounter(),
+    )
+
+
+def contents(history):
+    return [message["content"] for message in history.messages()[1:]]
+
+
+def test_window_limits_messages_until_summary_lands():
+    async def scenario():
+        summarizer = BlockingSummarizer()
+        history = make_history(summarizer)
+        for turn in range(5):
+            history.add("user", f"turn {turn}")
+        assert contents(history) == ["turn 2", "turn 3", "turn 4"]
+
+        summarizer.release.set()
+        await history.compaction
+        assert history.summary == "streszczenie"
+        assert contents(history) == ["turn 2", "turn 3", "turn 4"]
+        assert len(history.turns) == 3
+        assert "streszczenie" in history.messages()[0]["content"]
+
+    asyncio.run(scenario())
+
+
+def test_turns_added_during_compaction_are_kept():
+    async def scenario():
+        summarizer = BlockingSummarizer()
+        history = make_history(summarizer)
+        for turn in range(4):
+            history.add("user", f"turn {turn}")
+        compaction = history.compaction
+        history.add("assistant", "turn 4")
+        summarizer.release.set()
+        await compaction
+        assert history.compaction is None
+        assert contents(history) == ["turn 2", "turn 3", "turn 4"]
+
+    asyncio.run(scenario())
+
+
+def test_clear_during_compaction_discards_the_summary():
+    async def scenario():
+        summarizer = BlockingSummarizer()
+        history = make_history(summarizer)
+        for turn in range(4):
+            history.add("user", f"turn {turn}")
+        compaction = history.compaction
+        await asyncio.sleep(0)
+        assert summarizer.calls == 1
+
+        history.clear()
+        history.add("user", "fresh")
+        summarizer.release.set()
+        await asyncio.gather(compaction, return_exceptions=True)
+
+        assert compaction.cancelled()
+        assert history.summary == ""
+        assert contents(history) == ["fresh"]
+
+    asyncio.run(scenario())
+
+
+def test_summary_for_replaced_turns_is_ignored():
+    # A compaction that finishes after the turns were swapped out must not
+    # delete turns of the new conversation.
+    async def scenario():
+        summarizer = BlockingSummarizer()
+        history = make_history(summarizer)
+        for turn in range(4):
+            history.add("user", f"turn {turn}")
+        compaction = history.compaction
+        history.turns = []
+        history.add("user", "fresh")
+        summarizer.release.set()
+        await compaction
+        assert history.summary == ""
+        assert contents(history) == ["fresh"]
+
+    asyncio.run(scenario())
+
+
+def test_failed_summary_keeps_turns():
+    async def failing(messages):
+        raise RuntimeError("no summary")
+
+    async def scenario():
+        history = make_history(failing)
+        for turn in range(4):
+            history.add("user", f"turn {turn}")
+        await history.compaction
+        assert history.compaction is None
+        assert history.summary == ""
+        assert len(history.turns) == 4
+
+    asyncio.run(scenario())
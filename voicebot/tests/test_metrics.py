@@ -0,0 +1,17 @@
+from monitoring.metrics import Counter, Gauge, Registry
+
+
+def test_counter_metadata_uses_the_total_sample_name():
+    registry = Registry()
+    requests = Counter("requests", "Requests.", ["outcome"], registry=registry)
+    Gauge("depth", "Depth.", registry=registry).labels().set(2)
+    requests.labels("ok").inc()
+
+    assert registry.exposition().splitlines() == [
+        "# HELP requests_total Requests.",
+        "# TYPE requests_total counter",
+        'requests_total{outcome="ok"} 1.0',
+        "# HELP depth Depth.",
+        "# TYPE depth gauge",
+        "depth 2.0",
+    ]
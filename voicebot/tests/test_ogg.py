@@ -0,0 +1,78 @@
+import struct
+
+from discord_vc_tools.ogg import (
+    BOS,
+    EOS,
+    demux_ogg_opus,
+    is_ogg,
+    mux_ogg_opus,
+    ogg_crc,
+)
+from discord_vc_tools.opus_packets import packet_samples
+
+
+def opus_packet(size, seed=0):
+    # TOC 0xfc: CELT fullband, 20 ms, one frame.
+    return bytes([0xFC]) + bytes((seed + i) % 256 for i in range(size - 1))
+
+
+def split_pages(data):
+    pages = []
+    offset = 0
+    while offset < len(data):
+        segment_count = data[offset + 26]
+        segments = data[offset + 27 : offset + 27 + segment_count]
+        end = offset + 27 + segment_count + sum(segments)
+        pages.append(data[offset:end])
+        offset = end
+    return pages
+
+
+def test_crc_check_value():
+    # CRC-32 with polynomial 0x04c11db7, no reflection, zero init and xorout.
+    assert ogg_crc(b"123456789") == 0x89A1897F
+
+
+def test_round_trip_keeps_packets_on_lacing_boundaries():
+    packets = [
+        opus_packet(size, seed)
+        for seed, size in enumerate((1, 254, 255, 256, 510, 511, 3))
+    ]
+    data = mux_ogg_opus(packets, channels=2, serial=7)
+
+    assert is_ogg(data)
+    assert demux_ogg_opus(data) == (packets, 2)
+
+
+def test_pages_have_valid_crc_and_flags():
+    packets = [opus_packet(510, seed) for seed in range(120)]
+    pages = split_pages(mux_ogg_opus(packets, channels=1, serial=7))
+
+    assert len(pages) > 3
+    for sequence, page in enumerate(pages):
+        header_type, granule, serial, page_sequence, crc = struct.unpack_from(
+            "<BqIII", page, 5
+        )
+        unsigned = bytearray(page)
+        unsigned[22:26] = bytes(4)
+        assert crc == ogg_crc(unsigned)
+        assert serial == 7
+        assert page_sequence == sequence
+    assert pages[0][5] == BOS
+    assert pages[-1][5] == EOS
+    assert struct.unpack_from("<q", pages[-1], 6)[0] == sum(
+        packet_samples(packet) for packet in packets
+    )
+
+
+def test_demux_skips_other_streams():
+    first = [opus_packet(40, seed) for seed in range(3)]
+    second = [opus_packet(80, seed) for seed in range(5)]
+    data = mux_ogg_opus(first, serial=1) + mux_ogg_opus(second, serial=2)
+
+    assert demux_ogg_opus(data) == (first, 2)
+
+
+def test_empty_input_muxes_to_nothing():
+    assert mux_ogg_opus([]) == b""
+    assert mux_ogg_opus([b""]) == b""
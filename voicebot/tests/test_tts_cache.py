@@ -0,0 +1,92 @@
+import os
+
+from gcloud_api.tts_cache import TTSCache, cache_key
+
+
+def test_key_ignores_whitespace_but_not_request():
+    assert cache_key("Cześć,  jak\nsię masz?", b"voice") == cache_key(
+        "Cześć, jak się masz?", b"voice"
+    )
+    assert cache_key("Cześć", b"voice") != cache_key("Cześć", b"other voice")
+
+
+def test_memory_tier_evicts_least_recently_used_over_byte_cap():
+    cache = TTSCache(max_bytes=30)
+    cache.put("a", b"a" * 10)
+    cache.put("b", b"b" * 10)
+    cache.put("c", b"c" * 10)
+    assert cache.get("a") == b"a" * 10
+
+    cache.put("d", b"d" * 10)
+
+    assert cache.get("b") is None
+    assert [key for key in cache.entries] == ["c", "a", "d"]
+    assert cache.size == 30
+
+
+def test_replacing_an_entry_updates_size():
+    cache = TTSCache(max_bytes=30)
+    cache.put("a", b"a" * 10)
+    cache.put("a", b"a" * 20)
+    assert cache.size == 20
+
+
+def test_entry_larger_than_cap_is_not_kept_in_memory():
+    cache = TTSCache(max_bytes=10)
+    cache.put("small", b"s" * 5)
+    cache.put("large", b"l" * 11)
+    assert cache.get("large") is None
+    assert cache.get("small") == b"s" * 5
+    assert cache.size == 5
+
+
+def test_hits_and_misses_are_counted():
+    cache = TTSCache(max_bytes=10)
+    cache.put("a", b"a")
+    cache.get("a")
+    cache.get("b")
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_directory_tier_survives_a_new_cache(tmp_path):
+    TTSCache(max_bytes=10, directory=str(tmp_path)).put("a", b"audio")
+
+    cache = TTSCache(max_bytes=10, directory=str(tmp_path))
+
+    assert cache.get("a", memory_only=True) is None
+    assert cache.get("a") == b"audio"
+    assert cache.get("a", memory_only=True) == b"audio"
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_directory_tier_evicts_least_recently_used_files(tmp_path):
+    cache = TTSCache(max_bytes=10, directory=str(tmp_path), max_disk_bytes=35)
+    for age, key in enumerate("abc"):
+        cache.put(key, key.encode() * 10)
+        os.utime(tmp_path / f"{key}.audio", (age, age))
+    assert cache.get("a", memory_only=True) is None
+    cache.get("a")  # reading the file refreshes its mtime
+
+    cache.put("d", b"d" * 10)
+
+    assert sorted(path.stem for path in tmp_path.glob("*.audio")) == ["a", "c", "d"]
+    assert cache.disk_size == 30
+
+
+def test_directory_tier_counts_existing_files(tmp_path):
+    (tmp_path / "old.audio").write_bytes(b"o" * 25)
+    os.utime(tmp_path / "old.audio", (0, 0))
+    cache = TTSCache(max_bytes=1000, directory=str(tmp_path), max_disk_bytes=30)
+    assert cache.disk_size == 25
+
+    cache.put("new", b"n" * 10)
+
+    assert [path.stem for path in tmp_path.glob("*.audio")] == ["new"]
+    assert cache.disk_size == 10
+
+
+def test_file_larger_than_disk_cap_is_not_written(tmp_path):
+    cache = TTSCache(max_bytes=1000, directory=str(tmp_path), max_disk_bytes=5)
+    cache.put("a", b"a" * 10)
+    assert not list(tmp_path.glob("*.audio"))
+    assert cache.get("a") == b"a" * 10
@@ -0,0 +1,62 @@
+import asyncio
+
+from discord_vc_tools.utterance_queue import DROP_NEWEST, MERGE, UtteranceQueue
+
+
+def run_queue(items, latencies, workers=2, **options):
+    handled = []
+
+    async def handler(speaker, pcm_s16le, enqueued_at):
+        await asyncio.sleep(latencies.get(pcm_s16le, 0))
+        handled.append((speaker, pcm_s16le))
+
+    async def scenario():
+        queue = UtteranceQueue(
+            asyncio.get_running_loop(), handler, workers=workers, **options
+        )
+        for speaker, pcm_s16le in items:
+            queue.put_nowait(speaker, pcm_s16le)
+        queue.start()
+        while queue.pending or queue.busy:
+            await asyncio.sleep(0.01)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    return handled
+
+
+def test_one_speaker_is_handled_in_order():
+    handled = run_queue(
+        [(1, b"first"), (1, b"second")], {b"first": 0.1, b"second": 0.02}
+    )
+    assert handled == [(1, b"first"), (1, b"second")]
+
+
+def test_speakers_are_handled_in_parallel():
+    handled = run_queue(
+        [(1, b"slow"), (1, b"after slow"), (2, b"fast")],
+        {b"slow": 0.1, b"after slow": 0.0, b"fast": 0.02},
+    )
+    assert handled == [(2, b"fast"), (1, b"slow"), (1, b"after slow")]
+
+
+def test_overflow_merges_into_the_speakers_last_utterance():
+    handled = run_queue(
+        [(1, b"a"), (2, b"b"), (1, b"c")],
+        {},
+        workers=1,
+        maxsize=2,
+        overflow_policy=MERGE,
+    )
+    assert handled == [(1, b"ac"), (2, b"b")]
+
+
+def test_overflow_can_drop_the_newest():
+    handled = run_queue(
+        [(1, b"a"), (2, b"b"), (3, b"c")],
+        {},
+        workers=1,
+        maxsize=2,
+        overflow_policy=DROP_NEWEST,
+    )
+    assert handled == [(1, b"a"), (2, b"b")]
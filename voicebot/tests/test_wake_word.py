@@ -0,0 +1,58 @@
+import io
+import wave
+
+import numpy as np
+
+from discord_vc_tools.wake_word import (
+    CEPSTRA,
+    WakeWordDetector,
+    load_templates,
+    mfcc,
+    subsequence_dtw,
+)
+
+
+def tone(seconds, frequency=300, amplitude=8000):
+    t = np.arange(int(seconds * 16000)) / 16000
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+
+
+def wav_bytes(samples):
+    audio = io.BytesIO()
+    with wave.open(audio, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(samples.tobytes())
+    return audio.getvalue()
+
+
+def test_silence_has_no_features():
+    silence = np.zeros(16000, dtype=np.int16)
+    assert mfcc(silence).shape == (0, CEPSTRA - 1)
+    assert mfcc(silence, trim_silence=True).shape == (0, CEPSTRA - 1)
+    detector = WakeWordDetector(threshold=1.0)
+    detector.add_template(tone(0.5))
+    assert detector.score(silence) == np.inf
+    assert not detector.detect(silence)
+
+
+def test_dtw_matches_half_to_double_speed_only():
+    template = np.arange(20, dtype=np.float32)[:, None]
+    for length in (10, 20, 40):
+        utterance = np.linspace(0, 19, length, dtype=np.float32)[:, None]
+        assert subsequence_dtw(template, utterance) < 1
+    collapsed = np.linspace(0, 19, 5, dtype=np.float32)[:, None]
+    assert subsequence_dtw(template, collapsed) == np.inf
+
+
+def test_bad_template_files_are_skipped(tmp_path):
+    (tmp_path / "a_silent.wav").write_bytes(wav_bytes(np.zeros(8000, dtype=np.int16)))
+    (tmp_path / "b_broken.wav").write_bytes(b"not a wav file")
+    (tmp_path / "c_tone.wav").write_bytes(wav_bytes(tone(0.5)))
+    detector = WakeWordDetector(threshold=1.0)
+
+    load_templates(detector, str(tmp_path))
+
+    assert len(detector.templates) == 1
+    assert detector.ready
@@ -1,8 +1,18 @@
 from dotenv import load_dotenv
 import os
-
-from openai_api.openai_models import openai_gpt
-from discord_vc_tools.audio_api import AudioListener
+import asyncio
+import logging
+from functools import partial
+
+from openai_api.openai_models import openai_gpt_async, async_openai_provider
+from gcloud_api.gcloud_models import gcloud_provider, gcloud_tts
+from monitoring.metrics import start_metrics_server, track
+from discord_vc_tools.listener_manager import ListenerManager, SessionLimitReached
+from discord_vc_tools.wake_word import (
+    WakeWordDetector,
+    load_templates,
+    synthesize_templates,
+)
 
 from discord.ext import commands
 import discord
@@ -12,6 +22,15 @@ load_dotenv()
 
 owner_id = os.getenv("OWNER_ID")
 discord_token = os.getenv("DISCORD_TOKEN")
+metrics_port = os.getenv("METRICS_PORT")
+wake_word_templates = os.getenv("WAKE_WORD_TEMPLATES")
+wake_word_gate = os.getenv("WAKE_WORD_GATE") != "0"
+opus_passthrough = os.getenv("STT_OPUS_PASSTHROUGH") == "1"
+streaming_llm = os.getenv("STREAMING_LLM") == "1"
+streaming_stt = os.getenv("STREAMING_STT") == "1"
+streaming_tts = os.getenv("STREAMING_TTS") == "1"
+
+logger = logging.getLogger(__name__)
 
 
 class DiscordBot(commands.Bot):
@@ -20,9 +39,62 @@ class DiscordBot(commands.Bot):
         intents.voice_states = True
         intents.message_content = True
         super().__init__(command_prefix="!", intents=intents)
-        self.audio_listener = None
+        self.wake_word_detector = WakeWordDetector() if wake_word_gate else None
+        self.wake_word_phrases = ["Alvin", "Alwin"]
+        self.wake_word_voices = [f"pl-PL-Standard-{name}" for name in "ABCDE"]
+        self.listeners = ListenerManager(
+            wake_word_detector=self.wake_word_detector,
+            opus_passthrough=opus_passthrough,
+            streaming_llm=streaming_llm,
+            streaming_stt=streaming_stt,
+            streaming_tts=streaming_tts,
+        )
         self.tc_system_prompt = "Jesteś voicebotem na platformie Discord. Twoje imię to Alvin. Odpowiadaj zawsze zwięźle i krótko, maksymalnie na 100 słów."
 
+    async def setup_hook(self):
+        self.loop.create_task(self.warm_up_providers())
+        if metrics_port:
+            await start_metrics_server(int(metrics_port))
+            logger.info("Metrics served on http://127.0.0.1:%s/metrics", metrics_port)
+
+    async def warm_up_providers(self):
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, gcloud_provider.warm_up
+            )
+            logger.info("Google Cloud clients ready")
+        except Exception:
+            logger.exception("Google Cloud warm-up failed")
+        if self.wake_word_detector is not None:
+            await self.prepare_wake_word()
+
+    async def prepare_wake_word(self):
+        # Until templates are ready every utterance still goes to STT.
+        if wake_word_templates:
+            build = partial(load_templates, self.wake_word_detector, wake_word_templates)
+        else:
+            build = partial(
+                synthesize_templates,
+                self.wake_word_detector,
+                gcloud_tts,
+                self.wake_word_phrases,
+                self.wake_word_voices,
+            )
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, build)
+        except Exception:
+            logger.exception("Could not prepare wake word templates")
+            return
+        logger.info(
+            "Wake word spotting ready with %d templates",
+            len(self.wake_word_detector.templates),
+        )
+
+    async def close(self):
+        await self.listeners.stop_all()
+        await async_openai_provider.close()
+        await super().close()
+
 
 bot = DiscordBot()
 
@@ -31,7 +103,7 @@ bot = DiscordBot()
 
 @bot.event
 async def on_ready():
-    print(f"Logged in as {bot.user.name}")
+    logger.info("Logged in as %s", bot.user.name)
 
 
 @bot.event
@@ -47,7 +119,9 @@ async def on_message(message):
         {"role": "system", "content": bot.tc_system_prompt},
         {"role": "user", "content": message.content},
     ]
-    response = openai_gpt(messages)
+    guild = str(message.guild.id) if message.guild else "dm"
+    with track("llm_text", guild):
+        response = await openai_gpt_async(messages)
     await message.channel.send(response)
 
 
@@ -92,15 +166,16 @@ async def listen(ctx):
     if ctx.author.voice is None or ctx.author.voice.channel is None:
         await ctx.send("You are not connected to a voice channel.")
     else:
-        bot.audio_listener = AudioListener()
-        bot.loop.create_task(bot.audio_listener.message_sending_loop(bot.guilds[0]))
-        await bot.audio_listener.listen(ctx.author)
+        try:
+            await bot.listeners.start(ctx.author)
+        except SessionLimitReached:
+            await ctx.send("I am busy in too many voice channels right now.")
 
 
 @bot.command(name="stop_listening")
 async def stop_listening(ctx):
-    await bot.audio_listener.stop_listening()
-    bot.audio_listener = None
+    if ctx.guild is None or not await bot.listeners.stop(ctx.guild.id):
+        await ctx.send("I am not listening in this server.")
 
 
 @bot.command(name="check")